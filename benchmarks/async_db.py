@@ -0,0 +1,118 @@
+"""
+Requests per second of the favorites list query served through the old sync
+path (def endpoint + SessionLocal on the threadpool) and through the async
+path (async def endpoint + AsyncSession).
+
+    python -m benchmarks.async_db --events 20000 --favorites 500 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from benchmarks.asgi_client import request
+from models import Base, Event, Favorite, User
+from routers.favorites import favorites_query
+
+
+def _fill(url: str, events: int, favorites: int) -> None:
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.execute(Event.__table__.insert(), [
+            {"id": f"{i:024x}", "title": f"Event {i}", "details": "x" * 200, "archived": False} for i in range(events)
+        ])
+        db.add(User(id=1, username="bench", password_hash="-"))
+        db.execute(Favorite.__table__.insert(), [
+            {"user_id": 1, "event_id": f"{i * (events // favorites):024x}"} for i in range(favorites)
+        ])
+        db.commit()
+    engine.dispose()
+
+
+def _build_app(url: str) -> FastAPI:
+    sync_engine = create_engine(url, connect_args={"check_same_thread": False})
+    SyncSession = sessionmaker(bind=sync_engine, autoflush=False)
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+    def get_sync_db():
+        db = SyncSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app = FastAPI()
+    app.state.engines = (sync_engine, async_engine)
+    query = favorites_query(1)
+
+    @app.get("/sync")
+    def sync_page(db: Session = Depends(get_sync_db)):
+        total = db.scalar(select(func.count()).select_from(query.subquery()))
+        rows = db.execute(query.order_by(Favorite.id.desc()).limit(12)).all()
+        return {"total": total, "ids": [e.id for e, _ in rows]}
+
+    @app.get("/async")
+    async def async_page(db: AsyncSession = Depends(get_async_db)):
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+        rows = (await db.execute(query.order_by(Favorite.id.desc()).limit(12))).all()
+        return {"total": total, "ids": [e.id for e, _ in rows]}
+
+    return app
+
+
+async def _run(app: FastAPI, path: str, concurrency: int, duration: float) -> dict:
+    done, errors = 0, 0
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal done, errors
+        while time.perf_counter() < deadline:
+            status, _, _ = await request(app, "GET", path)
+            done += 1
+            errors += status != 200
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"path": path, "requests": done, "errors": errors, "rps": round(done / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--favorites", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.sqlite3')}"
+        _fill(url, args.events, args.favorites)
+        app = _build_app(url)
+
+        async def bench():
+            before = await _run(app, "/sync", args.concurrency, args.duration)
+            after = await _run(app, "/async", args.concurrency, args.duration)
+            sync_engine, async_engine = app.state.engines
+            sync_engine.dispose()
+            await async_engine.dispose()
+            return {"before": before, "after": after, "speedup": round(after["rps"] / max(before["rps"], 0.1), 2)}
+
+        print(json.dumps(asyncio.run(bench()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
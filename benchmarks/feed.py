@@ -0,0 +1,124 @@
+"""
+Synthetic moscow_events*.json feeds for the benchmarks: a catalog of the
+given size and rubric distribution, and its next-day version with part of
+the events changed, removed and added (for incremental imports).
+
+    python -m benchmarks.feed data/moscow_events_bench.json --events 50000 --rubrics concert=5,art=3,kids=1
+    python -m benchmarks.feed data/moscow_events_bench_2.json --events 50000 --changed 0.05 --removed 0.01 --added 0.02
+"""
+import argparse
+import itertools
+import json
+import random
+from typing import Dict, Optional
+
+
+WORDS = (
+    "концерт выставка спектакль фестиваль лекция экскурсия мастер-класс опера балет джаз "
+    "рок классика театр кино музей парк галерея современного искусства детский семейный "
+    "ночной вечер утро премьера гастроли оркестр квартет хор импровизация стендап квиз"
+).split()
+# rubric code -> relative share of events
+RUBRICS = {"concert": 8, "theatre": 6, "expo": 5, "cinema": 4, "kids": 3, "art": 3, "party": 2, "sport": 1}
+
+
+def _vocabulary(r: random.Random, size: int = 20_000):
+    # common event words + a long tail of names, so queries are as selective as real ones
+    syllables = "ка ло ми ра но ве ту си па ро да ли мо ре ни ко за бе".split()
+    return WORDS + ["".join(r.choices(syllables, k=r.randint(2, 4))) for _ in range(size)]
+
+
+def parse_rubrics(value: str) -> Dict[str, float]:
+    """
+    "concert=5,art=3,kids" -> {"concert": 5.0, "art": 3.0, "kids": 1.0}
+    """
+    rubrics = {}
+    for item in value.split(","):
+        code, _, weight = item.strip().partition("=")
+        if code:
+            rubrics[code] = float(weight or 1)
+    if not rubrics:
+        raise ValueError("No rubrics given")
+    return rubrics
+
+
+class FeedGenerator:
+    """
+    Deterministic event payloads (same seed -> same feed).
+    """
+
+    def __init__(self, rubrics: Optional[Dict[str, float]] = None, max_rubrics: int = 3, seed: int = 0):
+        self.r = random.Random(seed)
+        self.rubrics = list(rubrics or RUBRICS)
+        self.rubric_weights = list(itertools.accumulate((rubrics or RUBRICS).values()))
+        self.max_rubrics = max_rubrics
+        self.vocabulary = _vocabulary(self.r)
+        # zipf-like word frequencies: a few common words, many rare ones
+        self.word_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(self.vocabulary))))
+
+    def _words(self, low: int, high: int) -> str:
+        return " ".join(self.r.choices(self.vocabulary, cum_weights=self.word_weights, k=self.r.randint(low, high)))
+
+    def event(self, index: int) -> dict:
+        r = self.r
+        codes = r.choices(self.rubrics, cum_weights=self.rubric_weights, k=r.randint(1, self.max_rubrics))
+        return {
+            "title": self._words(2, 5).capitalize(),
+            "image_url": f"https://example.com/{index}.jpg",
+            "rating": round(r.uniform(3, 5), 1),
+            "price": f"{r.randint(3, 40) * 100} ₽",
+            "details": self._words(10, 60),
+            "rubrics": list(dict.fromkeys(codes)),
+        }
+
+    def feed(self, events: int, start: int = 0) -> Dict[str, dict]:
+        return {f"{i:024x}": self.event(i) for i in range(start, start + events)}
+
+    def next_day(self, feed: Dict[str, dict], changed: float = 0.05, removed: float = 0.01, added: float = 0.02) -> Dict[str, dict]:
+        """
+        Copy of feed with the given shares of events changed (new rating and
+        price), removed and added.
+        """
+        r = self.r
+        ids = list(feed)
+        gone = set(r.sample(ids, int(len(ids) * removed)))
+        result = {}
+        for event_id in ids:
+            if event_id in gone:
+                continue
+            payload = feed[event_id]
+            if r.random() < changed:
+                payload = dict(payload, rating=round(r.uniform(3, 5), 1), price=f"{r.randint(3, 40) * 100} ₽")
+            result[event_id] = payload
+        start = int(ids[-1], 16) + 1 if ids else 0
+        result.update(self.feed(int(len(ids) * added), start))
+        return result
+
+
+def write_feed(path: str, feed: Dict[str, dict]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(feed, f, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--rubrics", type=parse_rubrics, default=RUBRICS, help="code=weight,... (default: %(default)s)")
+    parser.add_argument("--max-rubrics", type=int, default=3, help="rubrics per event at most")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--changed", type=float, default=0.0, help="share of changed events (next-day feed)")
+    parser.add_argument("--removed", type=float, default=0.0, help="share of removed events (next-day feed)")
+    parser.add_argument("--added", type=float, default=0.0, help="share of added events (next-day feed)")
+    args = parser.parse_args()
+
+    generator = FeedGenerator(args.rubrics, args.max_rubrics, args.seed)
+    feed = generator.feed(args.events)
+    if args.changed or args.removed or args.added:
+        feed = generator.next_day(feed, args.changed, args.removed, args.added)
+    write_feed(args.path, feed)
+    print(f"{len(feed)} events written to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
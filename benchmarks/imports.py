@@ -0,0 +1,92 @@
+"""
+Duration of load_events_from_json on a generated feed: a cold import into an
+empty database, then an incremental import of the next-day feed.
+
+    python -m benchmarks.imports --events 50000 --changed 0.05 --repeat 3 --output imports.json
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from dataclasses import asdict
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from benchmarks.feed import RUBRICS, FeedGenerator, parse_rubrics, write_feed
+from benchmarks.report import environment, peak_rss_mb, write_result
+from migrations import migrate
+from models import Base
+from services.events_loader import load_events_from_json
+
+
+def _import(url: str, path: str, stream: bool):
+    engine = create_engine(url)
+    try:
+        with Session(engine) as db:
+            started = time.perf_counter()
+            stats = load_events_from_json(db, path, stream=stream)
+            return time.perf_counter() - started, stats
+    finally:
+        engine.dispose()
+
+
+def _summary(samples, events: int, stats) -> dict:
+    median = statistics.median(samples)
+    return {
+        "median_seconds": round(median, 3),
+        "min_seconds": round(min(samples), 3),
+        "events_per_second": round(events / median, 1),
+        "stats": {k: v for k, v in asdict(stats).items() if k != "duration"},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--rubrics", type=parse_rubrics, default=RUBRICS, help="code=weight,...")
+    parser.add_argument("--changed", type=float, default=0.05, help="share of changed events in the next-day feed")
+    parser.add_argument("--removed", type=float, default=0.01)
+    parser.add_argument("--added", type=float, default=0.02)
+    parser.add_argument("--stream", action="store_true", help="streaming import (chunked commits)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="also write the result to this JSON file")
+    args = parser.parse_args()
+
+    # before the feeds are built: git runs in a child process
+    env = environment()
+    with tempfile.TemporaryDirectory() as tmp:
+        generator = FeedGenerator(args.rubrics)
+        day1 = generator.feed(args.events)
+        day2 = generator.next_day(day1, args.changed, args.removed, args.added)
+        day1_path = os.path.join(tmp, "moscow_events_1.json")
+        day2_path = os.path.join(tmp, "moscow_events_2.json")
+        write_feed(day1_path, day1)
+        write_feed(day2_path, day2)
+
+        cold, incremental = [], []
+        for run in range(args.repeat):
+            url = f"sqlite:///{os.path.join(tmp, f'bench_{run}.sqlite3')}"
+            engine = create_engine(url)
+            Base.metadata.create_all(engine)
+            migrate(engine)
+            engine.dispose()
+
+            seconds, cold_stats = _import(url, day1_path, args.stream)
+            cold.append(seconds)
+            seconds, incremental_stats = _import(url, day2_path, args.stream)
+            incremental.append(seconds)
+
+    write_result({
+        "benchmark": "imports",
+        "environment": env,
+        "params": {k: v for k, v in vars(args).items() if k != "output"},
+        "cold": _summary(cold, len(day1), cold_stats),
+        "incremental": _summary(incremental, len(day2), incremental_stats),
+        "peak_rss_mb": peak_rss_mb(),
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
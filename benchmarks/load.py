@@ -0,0 +1,253 @@
+"""
+In-process load test of the API (the real app, lifespan included, on a
+generated catalog in a temporary directory): each scenario is run by
+--concurrency clients for --duration seconds, one user per client.
+
+    python -m benchmarks.load --events 20000 --concurrency 32 --duration 5 --output load.json
+    python -m benchmarks.load --scenarios events_anonymous,login --bcrypt-rounds 10
+"""
+import argparse
+import asyncio
+import importlib
+import io
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.asgi_client import form_body, multipart_body, request
+from benchmarks.feed import RUBRICS, FeedGenerator, parse_rubrics, write_feed
+from benchmarks.report import environment, latency_summary, peak_rss_mb, write_result
+
+
+PASSWORD = "bench-password-1"
+
+
+class Client:
+    """
+    One simulated user (anonymous if token is None).
+    """
+
+    def __init__(self, app, index: int, event_ids: List[str], rubrics: List[str], token: Optional[str] = None, user_id: Optional[int] = None):
+        self.app = app
+        self.index = index
+        self.event_ids = event_ids
+        self.rubrics = rubrics
+        self.token = token
+        self.user_id = user_id
+        self.r = random.Random(index)
+        self.favorites: List[str] = []
+        # distinct events per client, tickets can not be bought twice
+        self.to_buy = itertools.islice(itertools.cycle(event_ids), index * 7919 % len(event_ids), None)
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
+    async def get(self, url: str) -> int:
+        status, _, _ = await request(self.app, "GET", url, self.headers)
+        return status
+
+    async def events(self) -> int:
+        offset = self.r.randrange(0, 120, 12)
+        if self.r.random() < 0.5:
+            return await self.get(f"/api/events/?offset={offset}")
+        return await self.get(f"/api/events/?rubric={self.r.choice(self.rubrics)}&offset={offset}")
+
+
+async def events_page(client: Client) -> int:
+    return await client.events()
+
+
+async def favorites_list(client: Client) -> int:
+    return await client.get("/api/favorites/")
+
+
+async def favorites_toggle(client: Client) -> int:
+    # add a favorite, remove the oldest one once there are 20
+    if len(client.favorites) >= 20:
+        event_id = client.favorites.pop(0)
+        status, _, _ = await request(client.app, "DELETE", f"/api/favorites/{event_id}", client.headers)
+        return status
+    event_id = client.r.choice(client.event_ids)
+    if event_id in client.favorites:
+        return await favorites_list(client)
+    status, _, _ = await request(client.app, "POST", f"/api/favorites/{event_id}", client.headers)
+    client.favorites.append(event_id)
+    return status
+
+
+async def tickets_list(client: Client) -> int:
+    return await client.get("/api/tickets/")
+
+
+async def tickets_buy(client: Client) -> int:
+    status, _, _ = await request(client.app, "POST", f"/api/tickets/{next(client.to_buy)}", client.headers)
+    return status
+
+
+async def login(client: Client) -> int:
+    body, headers = form_body({"login": f"bench{client.index}", "password": PASSWORD})
+    status, _, _ = await request(client.app, "POST", "/api/auth/login", headers, body)
+    return status
+
+
+async def avatar(client: Client) -> int:
+    return await client.get(f"/api/avatars/{client.user_id}?size={client.r.choice((64, 128))}")
+
+
+# name -> (request, authenticated)
+SCENARIOS: Dict[str, Tuple[Callable[[Client], Awaitable[int]], bool]] = {
+    "events_anonymous": (events_page, False),
+    "events_authenticated": (events_page, True),
+    "favorites_list": (favorites_list, True),
+    "favorites_toggle": (favorites_toggle, True),
+    "tickets_list": (tickets_list, True),
+    "tickets_buy": (tickets_buy, True),
+    "login": (login, False),
+    "avatar": (avatar, False),
+}
+
+
+def _avatar_png(index: int) -> bytes:
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", (600, 600), ((index * 37) % 256, 120, 200)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+async def _register(app, index: int) -> dict:
+    body, headers = multipart_body(
+        {"username": f"bench{index}", "email": f"bench{index}@example.com", "password": PASSWORD},
+        {"avatar": ("avatar.png", _avatar_png(index), "image/png")},
+    )
+    status, _, content = await request(app, "POST", "/api/auth/register", headers, body)
+    if status != 200:
+        raise RuntimeError(f"Register failed with {status}: {content[:200]!r}")
+    return json.loads(content)
+
+
+async def _run(clients: List[Client], fn, duration: float) -> dict:
+    samples: List[float] = []
+    statuses: Counter = Counter()
+    deadline = time.perf_counter() + duration
+
+    async def worker(client: Client):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            status = await fn(client)
+            samples.append((time.perf_counter() - started) * 1000)
+            statuses[status] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(c) for c in clients))
+    result = latency_summary(samples, time.perf_counter() - started)
+    result["errors"] = sum(n for status, n in statuses.items() if status >= 400)
+    result["statuses"] = {str(status): n for status, n in sorted(statuses.items())}
+    return result
+
+
+def _configure(tmp: str, args) -> None:
+    """
+    Settings are read at import time: point them to the temporary
+    directory before the app is imported.
+    """
+    data_dir = os.path.join(tmp, "data")
+    os.makedirs(data_dir)
+    generator = FeedGenerator(args.rubrics)
+    write_feed(os.path.join(data_dir, "moscow_events_bench.json"), generator.feed(args.events))
+    os.environ.update({
+        "DATA_DIR": data_dir,
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.sqlite3')}",
+        "UPLOAD_DIR": os.path.join(tmp, "uploads"),
+        "IMAGE_CACHE_DIR": os.path.join(tmp, "images"),
+        "IMAGE_PREFETCH_LIMIT": "0",  # generated image urls point nowhere
+        "RATE_LIMIT_ENABLED": "false",  # every simulated user comes from one address
+    })
+    if args.bcrypt_rounds:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    # the app writes logs/ into the working directory
+    os.chdir(tmp)
+
+
+async def _bench(app, args) -> Dict[str, dict]:
+    from services.catalog import catalog
+
+    event_ids = [e.id for e in catalog.snapshot.events]
+    rubrics = list(args.rubrics)
+    users = [await _register(app, i) for i in range(args.concurrency)]
+    anonymous = [Client(app, i, event_ids, rubrics, user_id=u["user"]["id"]) for i, u in enumerate(users)]
+    authenticated = [
+        Client(app, i, event_ids, rubrics, token=u["access_token"], user_id=u["user"]["id"])
+        for i, u in enumerate(users)
+    ]
+
+    results = {}
+    for name in args.scenarios:
+        fn, needs_token = SCENARIOS[name]
+        clients = authenticated if needs_token else anonymous
+        # warm up caches, then measure
+        await _run(clients, fn, min(1.0, args.duration))
+        results[name] = await _run(clients, fn, args.duration)
+        print(f"{name}: {results[name]['rps']} rps, p95 {results[name]['p95_ms']} ms", file=sys.stderr)
+    return results
+
+
+def _scenarios(value: str) -> List[str]:
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20_000)
+    parser.add_argument("--rubrics", type=parse_rubrics, default=RUBRICS, help="code=weight,...")
+    parser.add_argument("--concurrency", type=int, default=32, help="simulated users")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario")
+    parser.add_argument("--scenarios", type=_scenarios, default=list(SCENARIOS), help=", ".join(SCENARIOS))
+    parser.add_argument("--bcrypt-rounds", type=int, help="override BCRYPT_ROUNDS (login cost)")
+    parser.add_argument("--output", help="also write the result to this JSON file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    env = environment()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        _configure(tmp, args)
+        app = importlib.import_module("main").app
+        logging.getLogger().setLevel(logging.WARNING)
+
+        async def bench():
+            started = time.perf_counter()
+            async with app.router.lifespan_context(app):
+                startup = time.perf_counter() - started
+                return startup, await _bench(app, args)
+
+        try:
+            startup, scenarios = asyncio.run(bench())
+        finally:
+            os.chdir(cwd)
+
+    write_result({
+        "benchmark": "load",
+        "environment": env,
+        "params": {k: v for k, v in vars(args).items() if k != "output"},
+        "startup_seconds": round(startup, 3),
+        "scenarios": scenarios,
+        # children: image pool processes, joined at shutdown
+        "peak_rss_mb": peak_rss_mb(),
+    }, output)
+
+
+if __name__ == "__main__":
+    main()
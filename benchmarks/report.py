@@ -0,0 +1,139 @@
+"""
+Benchmark results: latency percentiles, peak memory and JSON files that can
+be compared between runs.
+
+    python -m benchmarks.report before.json after.json --threshold 0.1
+"""
+import argparse
+import json
+import math
+import platform
+import resource
+import subprocess
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+def percentile(sorted_samples: Sequence[float], q: float) -> float:
+    """
+    Nearest-rank percentile (q in 0..100) of already sorted samples.
+    """
+    if not sorted_samples:
+        return 0.0
+    rank = min(len(sorted_samples), max(1, math.ceil(q / 100 * len(sorted_samples))))
+    return sorted_samples[rank - 1]
+
+
+def latency_summary(samples_ms: List[float], elapsed: float) -> dict:
+    samples = sorted(samples_ms)
+    return {
+        "requests": len(samples),
+        "rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(samples, 50), 2),
+        "p95_ms": round(percentile(samples, 95), 2),
+        "p99_ms": round(percentile(samples, 99), 2),
+        "max_ms": round(samples[-1], 2) if samples else 0.0,
+    }
+
+
+def peak_rss_mb() -> Dict[str, float]:
+    """
+    Peak resident memory of this process and of its (finished) child
+    processes, e.g. the image pool workers.
+    """
+    # ru_maxrss is in kilobytes on linux, in bytes on macOS
+    unit = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit, 1),
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def environment() -> dict:
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def write_result(result: dict, path: Optional[str] = None) -> None:
+    """
+    Print the result as JSON, and save it to path when given.
+    """
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    print(text)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+# metric name suffix -> whether a larger value is better
+_METRICS = {"_ms": False, "_seconds": False, "rps": True, "events_per_second": True}
+
+
+def _metrics(result, prefix: str = "") -> Iterator[Tuple[str, float, bool]]:
+    if isinstance(result, dict):
+        for key, value in result.items():
+            if key == "environment":
+                continue
+            yield from _metrics(value, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(result, (int, float)) and not isinstance(result, bool):
+        for suffix, higher_is_better in _METRICS.items():
+            if prefix.endswith(suffix):
+                yield prefix, result, higher_is_better
+                break
+
+
+def compare(before: dict, after: dict, threshold: float) -> List[dict]:
+    """
+    Metrics of both runs with their relative change; regressions are the
+    changes for the worse by more than threshold (0.1 = 10%).
+    """
+    old = {name: value for name, value, _ in _metrics(before)}
+    rows = []
+    for name, value, higher_is_better in _metrics(after):
+        if name not in old or not old[name]:
+            continue
+        change = (value - old[name]) / old[name]
+        worse = -change if higher_is_better else change
+        rows.append({
+            "metric": name, "before": old[name], "after": value,
+            "change": round(change, 3), "regression": worse > threshold,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+
+    rows = compare(before, after, args.threshold)
+    for row in rows:
+        mark = "REGRESSION" if row["regression"] else ""
+        print(f"{row['metric']:<50} {row['before']:>12} {row['after']:>12} {row['change']:>+8.1%} {mark}")
+    # non-zero exit status, so CI can fail on regressions
+    sys.exit(1 if any(row["regression"] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
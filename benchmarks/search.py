@@ -0,0 +1,91 @@
+"""
+Latency of /api/events/search queries (FTS5) against the LIKE scan clients
+would otherwise need, on a generated catalog.
+
+    python -m benchmarks.search --events 100000 --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, func, or_, select
+from sqlalchemy.orm import Session
+
+from benchmarks.feed import FeedGenerator, write_feed
+from migrations import migrate
+from models import Base, Event
+from services.events_loader import load_events_from_json
+from services.search import match_expression, search_query
+
+
+QUERIES = ("концерт", "джаз", "выставка современного", "теат", "детский спектакль", "оркестр премьера", "квиз")
+
+
+def _like_query(q: str):
+    query = select(Event).where(Event.archived == False)
+    for word in q.split():
+        query = query.where(or_(Event.title.ilike(f"%{word}%"), Event.details.ilike(f"%{word}%")))
+    return query.order_by(Event.id)
+
+
+def _like_page(db: Session, q: str, limit: int = 12) -> None:
+    query = _like_query(q)
+    db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+    db.scalars(query.limit(limit)).all()
+
+
+def _search_page(db: Session, q: str, limit: int = 12) -> None:
+    # same statements as the search endpoint
+    query = search_query(match_expression(q))
+    db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+    ids = db.scalars(query.limit(limit)).all()
+    db.scalars(select(Event).where(Event.id.in_(ids))).all()
+
+
+def _timings(db: Session, page, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        for q in QUERIES:
+            started = time.perf_counter()
+            page(db, q)
+            samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "queries": len(samples),
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 2),
+        "max_ms": round(samples[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20, help="runs of the query set")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        feed = os.path.join(tmp, "moscow_events_bench.json")
+        write_feed(feed, FeedGenerator().feed(args.events))
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.sqlite3')}")
+        Base.metadata.create_all(engine)
+        migrate(engine)
+        with Session(engine) as db:
+            load_events_from_json(db, feed)
+
+        with Session(engine) as db:
+            result = {
+                "events": args.events,
+                "before": _timings(db, _like_page, args.repeat),
+                "after": _timings(db, _search_page, args.repeat),
+            }
+        engine.dispose()
+    result["speedup_p50"] = round(result["before"]["p50_ms"] / max(result["after"]["p50_ms"], 0.01), 1)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
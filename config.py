@@ -1,4 +1,5 @@
 import os
+from typing import Dict, List
 
 from pydantic_settings import BaseSettings
 
@@ -9,15 +10,114 @@ BASE_DIR = "/opt/afisha-server"
 class Settings(BaseSettings):
     # paths
     DATA_DIR: str = os.path.join(BASE_DIR, "data")
+    LOCK_DIR: str = os.path.join(BASE_DIR, "run")  # worker coordination (import/migration locks)
     UPLOAD_DIR: str = os.path.join(BASE_DIR, "uploads/avatars")
 
+    # catalog updates
+    IMPORT_INTERVAL_SECONDS: int = 60 * 60 * 24  # feed import by the importing worker
+    CATALOG_POLL_SECONDS: int = 30  # other workers check for a new catalog version this often
+
+    # images
+    IMAGE_WORKERS: int = 2  # processes decoding/resizing avatars and event images
+    IMAGE_CACHE_DIR: str = os.path.join(BASE_DIR, "cache/images")  # event image thumbnails
+    IMAGE_CACHE_BYTES: int = 512 * 1024 * 1024  # least recently used thumbnails are evicted above this
+    IMAGE_SIZES: List[int] = [160, 480]  # px, largest side of the event thumbnails
+    IMAGE_FETCH_CONCURRENCY: int = 4  # parallel downloads from the upstream host
+    IMAGE_FETCH_TIMEOUT: float = 10.0
+    IMAGE_MAX_BYTES: int = 10 * 1024 * 1024
+    IMAGE_PREFETCH_LIMIT: int = 1000  # thumbnails fetched in the background after an import
+
+    # avatars
+    AVATAR_MAX_BYTES: int = 5 * 1024 * 1024  # larger uploads are rejected with 413
+    AVATAR_SIZES: List[int] = [64, 128, 512]  # px, largest side of the WebP variants
+    AVATAR_CACHE_BYTES: int = 32 * 1024 * 1024  # in-memory LRU of served avatar files
+    AVATAR_CACHE_FILE_BYTES: int = 64 * 1024  # larger files are streamed from disk
+
     # db
     DATABASE_URL: str =f"sqlite:///{os.path.join(BASE_DIR, 'db/afisha.sqlite3')}"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # wait for the write lock instead of failing at once
+    WRITE_BATCH_SIZE: int = 128  # favorite/ticket operations per commit
+    WRITE_BATCH_DELAY_MS: int = 5  # max wait for more operations before a commit
+    WRITE_QUEUE_LIMIT: int = 1024
+    SLOW_QUERY_MS: int = 200  # statements slower than this are logged with their route (0: off)
+    QUERY_REPEAT_LIMIT: int = 10  # one statement this many times in a request is logged as N+1 (0: off)
+    # "METHOD /route" -> statements per request, requests over it are logged.
+    # Worst case measured by tests/test_query_budgets.py: authenticated, cold caches
+    QUERY_BUDGETS: Dict[str, int] = {
+        "GET /api/events/": 3,
+        "GET /api/events/search": 6,
+        "GET /api/rubrics/": 8,  # per-user counts in one read transaction (BEGIN/COMMIT)
+        "GET /api/favorites/": 5,
+        "POST /api/favorites/{event_id}": 5,  # first change of a user creates its user_states row
+        "DELETE /api/favorites/{event_id}": 4,
+        "GET /api/tickets/": 5,
+        "POST /api/tickets/{event_id}": 6,  # replaces a favorite
+        "POST /api/auth/register": 4,
+        "POST /api/auth/login": 2,  # rehash of a password stored with another cost
+        "GET /api/avatars/{user_id}": 3,
+        "GET /api/images/{event_id}": 2,
+    }
+
+    # admission control: requests in progress per "METHOD /route", a bounded
+    # queue waits for a slot, beyond it (or after the timeout) the answer is 503
+    ADMISSION_CONCURRENCY: int = 64  # routes not in ADMISSION_LIMITS (0: admission control off)
+    ADMISSION_LIMITS: Dict[str, int] = {
+        "POST /api/auth/register": 4,  # bcrypt: PASSWORD_HASH_WORKERS do the work anyway
+        "POST /api/auth/login": 8,
+        "GET /api/avatars/{user_id}": 16,
+        "GET /api/images/{event_id}": 16,
+    }
+    ADMISSION_QUEUE_LIMIT: int = 128  # waiting requests per route
+    ADMISSION_QUEUE_TIMEOUT: float = 2.0  # seconds
+    ADMISSION_RETRY_AFTER: int = 1  # Retry-After of 503 answers, seconds
+    # token buckets per client (user id, or ip for anonymous requests) and worker: requests per second and burst
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT: float = 20
+    RATE_LIMIT_BURST: int = 40
+    # routes with their own, tighter buckets: "METHOD /route" -> [per second, burst]
+    RATE_LIMITS: Dict[str, List[float]] = {
+        "POST /api/auth/login": [0.2, 5],
+        "POST /api/auth/register": [0.05, 3],
+        # a page of events loads one image per event, lists show avatars
+        "GET /api/images/{event_id}": [100, 300],
+        "GET /api/avatars/{user_id}": [100, 300],
+        "GET /api/avatars/files/{name}": [100, 300],
+    }
+    RATE_LIMIT_CLIENTS: int = 100_000  # buckets kept in memory per limit
+    # reverse proxies (addresses or networks) whose Forwarded / X-Forwarded-For
+    # headers name the client; without them all clients behind a proxy share
+    # its buckets. Not needed with `uvicorn --proxy-headers --forwarded-allow-ips`
+    TRUSTED_PROXIES: List[str] = []
+    ADMISSION_EXEMPT: List[str] = ["GET /metrics"]  # neither queued nor rate limited
+
+    # logging
+    LOG_LEVEL: str = "DEBUG"
+    LOG_LEVELS: Dict[str, str] = {  # per module
+        "sqlalchemy": "WARNING",
+        "aiosqlite": "WARNING",  # logs every operation with its parameters at DEBUG
+        "asyncio": "WARNING",
+        "python_multipart": "WARNING",  # a record per form field and file chunk
+        "multipart": "WARNING",
+        "PIL": "INFO",  # image plugin chatter
+        "playwright": "WARNING",
+    }
+    LOG_FORMAT: str = "text"  # text or json (one object per line)
+    LOG_DIR: str = "logs"
+    LOG_FILE_BYTES: int = 10 * 1024 * 1024
+    LOG_FILE_COUNT: int = 10
+    LOG_QUEUE_SIZE: int = 10_000  # records waiting for the writer thread, below ERROR the excess is dropped
 
     # JWT
     JWT_SECRET_KEY: str = "secret_key"
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRE_MINUTES: int = 60 * 24  # 1 day
+    TOKEN_CACHE_SIZE: int = 10_000  # verified tokens kept in memory
+    TOKEN_CACHE_TTL_SECONDS: int = 60
+
+    # password hashing
+    BCRYPT_ROUNDS: int = 12  # stored hashes with another cost are rehashed on login
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_LIMIT: int = 32  # waiting hash jobs before answering 503
 
     class Config:
         env_file = ".env"
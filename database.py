@@ -1,8 +1,21 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from models import Base
+from migrations import migrate
 from config import settings
+from utils.db_stats import track_queries
+
+
+# async drivers for the sync DATABASE_URL dialects
+_ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def _async_url(url: str):
+    url = make_url(url)
+    return url.set(drivername=f"{url.get_backend_name()}+{_ASYNC_DRIVERS[url.get_backend_name()]}")
 
 
 engine = create_engine(
@@ -11,7 +24,33 @@ engine = create_engine(
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# async path for request handlers (imports, background jobs and the favorite/ticket writer stay on the sync engine)
+async_engine = create_async_engine(_async_url(settings.DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    WAL: readers work on their own connections from a snapshot and never wait
+    for the writer; synchronous=NORMAL syncs on checkpoints, not on every commit.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+
+# query count / time per request for /metrics
+track_queries(engine)
+track_queries(async_engine.sync_engine)
+
 
-# create table on start (only dev variant!)
+# create missing tables, then upgrade the existing ones in place
 def init_db():
     Base.metadata.create_all(bind=engine)
+    migrate(engine)
@@ -5,50 +5,58 @@ from datetime import datetime
 from fastapi_utils.tasks import repeat_every
 
 from config import settings
-from database import init_db, SessionLocal
-from utils.logging_utils import setup_logging
-from services.events_loader import get_latest_data_file, load_events_from_json
+from database import async_engine
+from utils.logging_utils import setup_logging, stop_logging
+from utils.middleware import AdmissionMiddleware, BodyLimitMiddleware, MetricsMiddleware
+from services.import_scheduler import import_scheduler
+from services.writer import writer
+from services.image_pool import image_pool
+from services.image_proxy import image_proxy
 
-from routers import auth, events, favorites, tickets, avatars
+from routers import auth, events, favorites, tickets, avatars, images, metrics, rubrics
 
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
 
+def _task_failed(e: Exception):
+    logger.error(f"[{datetime.now()}] Catalog update failed: {e!r}", exc_info=e)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    init_db()
-    db = SessionLocal()
-    try:
-        latest_file = get_latest_data_file(settings.DATA_DIR)
-        if latest_file:
-            logger.info(f"[{datetime.now()}] Initial DB update from {latest_file}")
-            load_events_from_json(db, latest_file)
-        else:
-            logger.warning(f"[{datetime.now()}] No data files found in {settings.DATA_DIR}")
-    finally:
-        db.close()
-
-    @repeat_every(seconds=60*60*24)
-    def update_db_from_file_task():
-        db = SessionLocal()
-        try:
-            latest_file = get_latest_data_file(settings.DATA_DIR)
-            if latest_file:
-                logger.info(f"[{datetime.now()}] Updating DB from {latest_file}")
-                load_events_from_json(db, latest_file)
-        finally:
-            db.close()
+    image_proxy.start()
+    # migrations, initial import (in one worker only) and catalog load
+    import_scheduler.startup()
+
+    # the importing worker imports feeds daily, every worker reloads a changed catalog
+    @repeat_every(seconds=settings.CATALOG_POLL_SECONDS, wait_first=settings.CATALOG_POLL_SECONDS, on_exception=_task_failed)
+    def update_catalog_task():
+        import_scheduler.tick()
 
+    writer.start()
+    await update_catalog_task()
     yield
+    await writer.stop()
+    await image_proxy.stop()
+    image_pool.shutdown()
+    await async_engine.dispose()
     logger.info(f"[{datetime.now()}] Server shutting down…")
+    stop_logging()
 
 
 app = FastAPI(title="Afisha API", lifespan=lifespan)
+# added last runs first: metrics also count the rejected requests
+app.add_middleware(BodyLimitMiddleware)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
 # Routers
 app.include_router(auth.router)
 app.include_router(events.router)
+app.include_router(rubrics.router)
 app.include_router(favorites.router)
 app.include_router(tickets.router)
-app.include_router(avatars.router)
\ No newline at end of file
+app.include_router(avatars.router)
+app.include_router(images.router)
+app.include_router(metrics.router)
@@ -0,0 +1,121 @@
+import logging
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select
+from sqlalchemy.engine import Connection, Engine
+
+from models import Base
+from services.rubric_counts import count_rubric_events
+from services.search import create_search_index
+from utils.query_plan import update_statistics
+
+
+logger = logging.getLogger(__name__)
+
+
+# -----------------------------
+# Versioned schema migrations.
+# create_all only creates missing tables, so every change to an existing
+# table (indexes, columns) is shipped as a numbered migration here and
+# applied in order on startup. Migrations must be idempotent: on a fresh
+# database create_all has already built the current schema.
+# -----------------------------
+_meta = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations", _meta,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+def _create_indexes(*names: str) -> Callable[[Connection], None]:
+    """
+    Upgrade creating indexes declared in models.py by name.
+    """
+    indexes = {i.name: i for table in Base.metadata.tables.values() for i in table.indexes}
+
+    def upgrade(conn: Connection) -> None:
+        for name in names:
+            indexes[name].create(conn, checkfirst=True)
+    return upgrade
+
+
+def _add_column(conn: Connection, table: str, name: str) -> None:
+    """
+    Add a column declared in models.py to an existing table (no-op if it is there).
+    """
+    if name in {c["name"] for c in inspect(conn).get_columns(table)}:
+        return
+    column = Base.metadata.tables[table].c[name]
+    ddl = f"ALTER TABLE {table} ADD COLUMN {name} {column.type.compile(conn.dialect)}"
+    if column.server_default is not None:
+        ddl += f" DEFAULT {column.server_default.arg}"
+    if not column.nullable:
+        ddl += " NOT NULL"
+    conn.exec_driver_sql(ddl)
+
+
+def _rubric_counts(conn: Connection) -> None:
+    _add_column(conn, "rubrics", "active_events")
+    count_rubric_events(conn)
+
+
+def _analyze(conn: Connection) -> None:
+    # refresh planner statistics after index changes
+    update_statistics(conn)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "indexes for catalog, favorites and tickets queries", _create_indexes(
+        "ix_events_archived_id",
+        "ix_event_rubrics_rubric_event",
+        "ix_favorites_user_id",
+        "ix_tickets_user_id",
+    )),
+    Migration(2, "planner statistics", _analyze),
+    Migration(3, "full-text index of events", create_search_index),
+    Migration(4, "active event counts of rubrics", _rubric_counts),
+]
+
+
+def get_schema_version(conn: Connection) -> int:
+    return conn.scalar(select(func.max(schema_migrations.c.version))) or 0
+
+
+def migrate(engine: Engine) -> int:
+    """
+    Apply pending migrations in order, each in its own transaction; return the schema version.
+    """
+    _meta.create_all(engine, checkfirst=True)
+    with engine.connect() as conn:
+        version = get_schema_version(conn)
+
+    applied = False
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        applied = True
+        logger.info(f"Applying migration {migration.version}: {migration.name}")
+        with engine.begin() as conn:
+            migration.upgrade(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=migration.version, name=migration.name, applied_at=datetime.now(),
+            ))
+        version = migration.version
+
+    if applied:
+        # statistics of the upgraded schema; an empty database gets them from its first import
+        events = Base.metadata.tables["events"]
+        with engine.begin() as conn:
+            if conn.scalar(select(events.c.id).limit(1)) is not None:
+                update_statistics(conn)
+    return version
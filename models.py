@@ -1,6 +1,7 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import String, Integer, Float, Text, ForeignKey, UniqueConstraint, Boolean
+from sqlalchemy import String, Integer, Float, Text, ForeignKey, UniqueConstraint, Boolean, DateTime, Index
 from typing import Optional
+from datetime import datetime
 
 
 class Base(DeclarativeBase):
@@ -24,6 +25,37 @@ class Event(Base):
 
     archived: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
 
+    __table_args__ = (Index("ix_events_archived_id", "archived", "id"),)
+
+
+# -----------------------------
+# Event content hashes (for delta imports)
+# -----------------------------
+class EventHash(Base):
+    __tablename__ = "event_hashes"
+
+    event_id: Mapped[str] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"), primary_key=True)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=False)  # sha256 of the feed payload
+
+
+# -----------------------------
+# Import runs (ledger)
+# -----------------------------
+class ImportRun(Base):
+    __tablename__ = "import_runs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    file_name: Mapped[str] = mapped_column(String, nullable=False)
+    file_hash: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    started_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    duration: Mapped[float] = mapped_column(Float, nullable=False)
+    events: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    inserted: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    unchanged: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    archived: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    unarchived: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
 
 # -----------------------------
 # Rubrics
@@ -33,6 +65,7 @@ class Rubric(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     code: Mapped[str] = mapped_column(String(32), unique=True, nullable=False)  # "cinema", "art", ...
+    active_events: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")  # set by the importer
 
 
 # -----------------------------
@@ -45,7 +78,10 @@ class EventRubric(Base):
     event_id: Mapped[str] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"), nullable=False)
     rubric_id: Mapped[int] = mapped_column(ForeignKey("rubrics.id", ondelete="CASCADE"), nullable=False)
 
-    __table_args__ = (UniqueConstraint("event_id", "rubric_id", name="uix_event_rubric"),)
+    __table_args__ = (
+        UniqueConstraint("event_id", "rubric_id", name="uix_event_rubric"),
+        Index("ix_event_rubrics_rubric_event", "rubric_id", "event_id"),
+    )
 
     event = relationship("Event", back_populates="rubrics")
     rubric = relationship("Rubric")
@@ -64,6 +100,16 @@ class User(Base):
     avatar_url: Mapped[Optional[str]] = mapped_column(String, nullable=True)
 
 
+# -----------------------------
+# User state version (bumped on favorite/ticket changes)
+# -----------------------------
+class UserState(Base):
+    __tablename__ = "user_states"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
 # -----------------------------
 # Favorites (user <-> event)
 # -----------------------------
@@ -74,7 +120,10 @@ class Favorite(Base):
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     event_id: Mapped[str] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"))
 
-    __table_args__ = (UniqueConstraint("user_id", "event_id", name="uix_user_favorite"),)
+    __table_args__ = (
+        UniqueConstraint("user_id", "event_id", name="uix_user_favorite"),
+        Index("ix_favorites_user_id", "user_id", id.desc()),
+    )
 
 
 # -----------------------------
@@ -87,4 +136,7 @@ class Ticket(Base):
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     event_id: Mapped[str] = mapped_column(ForeignKey("events.id", ondelete="CASCADE"))
 
-    __table_args__ = (UniqueConstraint("user_id", "event_id", name="uix_user_ticket"),)
+    __table_args__ = (
+        UniqueConstraint("user_id", "event_id", name="uix_user_ticket"),
+        Index("ix_tickets_user_id", "user_id", "id"),
+    )
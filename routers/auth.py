@@ -1,44 +1,56 @@
-import os, shutil
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import SessionLocal
+from database import AsyncSessionLocal
 from models import User
-from utils.security import hash_password, verify_password, create_access_token
+from utils.security import hash_password, verify_and_update_password, create_access_token, hashing_pool
 from config import settings
 from schemas import AuthResponse, UserCreate, UserOut
+from services.avatars import avatar_index, process_avatar, read_upload, remove_avatar
 
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
+async def _find_conflict(db: AsyncSession, username: str, email: Optional[str]) -> Optional[str]:
+    if await db.scalar(select(User.id).where(User.username == username)):
+        return "Username already exists"
+    if email and await db.scalar(select(User.id).where(User.email == email)):
+        return "Email already exists"
+    return None
+
+
+async def _find_user(db: AsyncSession, login: str) -> Optional[User]:
+    # check, if it email (by '@')
+    if "@" in login:
+        return await db.scalar(select(User).where(User.email == login))
+    return await db.scalar(select(User).where(User.username == login))
+
+
+# bcrypt runs in the dedicated hashing pool, avatar resizing in the image process pool
 @router.post("/register", response_model=AuthResponse)
-def register(
+async def register(
     username: str = Form(...),
     password: str = Form(...),
     email: Optional[str] = Form(None),
     avatar: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    if db.query(User).filter(User.username == username).first():
+    conflict = await _find_conflict(db, username, email)
+    if conflict:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, 
-            detail="Username already exists"
-        )
-    if email and db.query(User).filter(User.email == email).first():
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT, 
-            detail="Email already exists"
+            detail=conflict
         )
 
     try:
@@ -46,25 +58,33 @@ def register(
     except Exception as e:
         raise HTTPException(status_code=422, detail=str(e))
 
+    # avatar first: an oversized or broken upload (413/422) costs no bcrypt round.
+    # variants are content addressed, a retry after a 503 below reuses them
     avatar_url = None
     if avatar and avatar.filename:
-        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-        ext = os.path.splitext(avatar.filename)[1].lower() # type: ignore
-        safe_filename = f"{username}{ext}" if ext else username
-        avatar_path = os.path.join(settings.UPLOAD_DIR, safe_filename)
-        with open(avatar_path, "wb") as f:
-            shutil.copyfileobj(avatar.file, f)
-        avatar_url = safe_filename
+        data = await read_upload(avatar, settings.AVATAR_MAX_BYTES)
+        avatar_url = await process_avatar(data)
+
+    password_hash = await hashing_pool.run(hash_password, password)
 
     user = User(
         username=username,
         email=email,
-        password_hash=hash_password(password),
+        password_hash=password_hash,
         avatar_url=avatar_url
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # registered by a concurrent request since the check above
+        await db.rollback()
+        if avatar_url and not await db.scalar(select(User.id).where(User.avatar_url == avatar_url).limit(1)):
+            await run_in_threadpool(remove_avatar, avatar_url)
+        conflict = await _find_conflict(db, username, email)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=conflict or "Username or email already exists")
+    await db.refresh(user)
+    avatar_index.set(user.id, user.avatar_url)
 
     token = create_access_token({"sub": str(user.id)})
 
@@ -72,19 +92,22 @@ def register(
 
 
 @router.post("/login", response_model=AuthResponse)
-def login(
+async def login(
     login: str = Form(...),  # one field username/email
     password: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    # check, if it email (by '@')
-    if "@" in login:
-        user = db.query(User).filter(User.email == login).first()
-    else:
-        user = db.query(User).filter(User.username == login).first()
+    user = await _find_user(db, login)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    if not user or not verify_password(password, user.password_hash):
+    valid, new_hash = await hashing_pool.run(verify_and_update_password, password, user.password_hash)
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # bcrypt cost changed in settings
+        user.password_hash = new_hash
+        await db.commit()
 
     token = create_access_token({"sub": str(user.id)})
     return AuthResponse(access_token=token, user=UserOut.model_validate(user))
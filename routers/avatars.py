@@ -1,36 +1,87 @@
+import mimetypes
 import os
+from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
-
-from database import SessionLocal
-from models import User
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import settings
+from database import AsyncSessionLocal
+from models import User
+from services.avatars import avatar_cache, avatar_file, avatar_index, is_variant_name
+from utils.etag import not_modified
 
 
 router = APIRouter(prefix="/api/avatars", tags=["avatars"])
 
+# user id urls may point to another file later, content-addressed file names never change
+USER_CACHE_CONTROL = "public, max-age=300"
+FILE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+async def _avatar_url(db: AsyncSession, user_id: int) -> Optional[str]:
+    if not avatar_index.loaded:
+        await db.run_sync(avatar_index.load)
+    known, avatar_url = avatar_index.lookup(user_id)
+    if known:
+        return avatar_url
+    # registered by another worker after the index was loaded
+    user = await db.get(User, user_id)
+    if user is None:
+        return None
+    avatar_index.set(user.id, user.avatar_url)
+    return user.avatar_url
+
+
+async def _serve(request: Request, path: str, cache_control: str) -> Response:
+    """
+    Avatar file with a strong ETag, from the in-memory cache when it is small.
+    """
+    cached = avatar_cache.get(path)
+    if cached is None:
+        try:
+            cached = await run_in_threadpool(avatar_cache.load, path)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Avatar file not found")
+    etag, data = cached
+
+    not_changed = not_modified(request, etag, cache_control)
+    if not_changed:
+        return not_changed
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if data is None:
+        return FileResponse(path, headers=headers)
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return Response(content=data, media_type=media_type, headers=headers)
+
+
+@router.get("/files/{name}")
+async def get_avatar_file(request: Request, name: str):
+    """
+    Content-addressed avatar variant (<key>_<size>.webp), cacheable forever.
+    """
+    if not is_variant_name(name):
+        raise HTTPException(status_code=404, detail="Avatar file not found")
+    return await _serve(request, os.path.join(settings.UPLOAD_DIR, name), FILE_CACHE_CONTROL)
 
 
 @router.get("/{user_id}")
-def get_avatar(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user or not user.avatar_url:
+async def get_avatar(
+    request: Request,
+    user_id: int,
+    size: Optional[int] = Query(None, ge=1, le=2048),
+    db: AsyncSession = Depends(get_db)
+):
+    avatar_url = await _avatar_url(db, user_id)
+    if not avatar_url:
         raise HTTPException(status_code=404, detail="User not found")
-    
-    # get full path by uploads/avatars
-    filepath = os.path.join(settings.UPLOAD_DIR, user.avatar_url)
-    
-    if not os.path.exists(filepath):
-        raise HTTPException(status_code=404, detail="Avatar file not found")
-    
-    return FileResponse(filepath)
+
+    # variant of the requested size under uploads/avatars
+    return await _serve(request, avatar_file(avatar_url, size), USER_CACHE_CONTROL)
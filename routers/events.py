@@ -1,68 +1,150 @@
-from typing import Optional
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import SessionLocal
-from models import Event, EventRubric, Rubric, Favorite, Ticket, User
-from utils.security import get_optional_user
-from schemas import PaginatedEvents, EventOut
+from database import AsyncSessionLocal
+from models import Event, EventRubric, Rubric
+from utils.security import get_optional_identity, UserIdentity
+from schemas import PaginatedEvents
+from services.catalog import catalog, get_catalog_version
+from services.fragments import fragments, render_page
+from services.membership import membership
+from services.search import match_expression, search_query, search_supported
+from services.user_state import get_user_state_version
+from utils.pagination import INT_MAX, encode_cursor, decode_cursor
+from utils.etag import make_etag, not_modified
 
 
 router = APIRouter(prefix="/api/events", tags=["events"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def events_query(rubric: Optional[str] = None, ids: Optional[List[str]] = None):
+    """
+    Active events filtered by rubric and ids (used until the catalog is loaded).
+    """
+    query = select(Event).where(Event.archived == False)
+    if ids:
+        query = query.where(Event.id.in_(ids))
+    if rubric:
+        # a filter, not a join: pages are read in events(archived, id) order without a sort
+        query = query.where(Event.id.in_(select(EventRubric.event_id).join(Rubric).where(Rubric.code == rubric)))
+    return query
 
 
 @router.get("/", response_model=PaginatedEvents)
-def get_events(
+async def get_events(
+    request: Request,
     rubric: Optional[str] = None,
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, le=INT_MAX),
     limit: int = Query(12, ge=1, le=50),
     id: Optional[str] = None,
-    user: Optional[User] = Depends(get_optional_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    user: Optional[UserIdentity] = Depends(get_optional_identity),
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(Event).filter(Event.archived == False)
+    ids = id.split(",") if id else None
+    after_id = decode_cursor(cursor, str)
 
-    if id:
-        ids = id.split(",")
-        query = query.filter(Event.id.in_(ids))
+    # conditional request: catalog version (+ user state version)
+    snapshot = catalog.snapshot
+    catalog_version = snapshot.version if snapshot is not None else await db.run_sync(get_catalog_version)
+    if user:
+        user_version = await db.run_sync(get_user_state_version, user.id)
+        etag, cache_control = make_etag(f"c{catalog_version}", f"u{user.id}.{user_version}"), "private, no-cache"
+    else:
+        etag, cache_control = make_etag(f"c{catalog_version}"), "no-cache"
+    cached = not_modified(request, etag, cache_control)
+    if cached:
+        return cached
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Authorization"}
 
-    if rubric:
-        query = query.join(EventRubric).join(Rubric).filter(Rubric.code == rubric)
+    if snapshot is not None:
+        positions = snapshot.select(rubric=rubric, ids=ids)
+        total = len(positions)
+        start = snapshot.seek(positions, after_id) if after_id is not None else offset
+        events = snapshot.page(positions, start, limit)
+        has_more = start + limit < total
+    else:
+        # catalog is not loaded yet
+        query = events_query(rubric, ids)
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+        query = query.order_by(Event.id)
+        if after_id is not None:
+            query = query.where(Event.id > after_id)
+        else:
+            query = query.offset(offset)
+        events = (await db.scalars(query.limit(limit + 1))).all()
+        has_more = len(events) > limit
+        events = events[:limit]
 
-    total = query.count()
-    events = query.offset(offset).limit(limit).all()
+    flags = await db.run_sync(membership.lookup, user.id, user_version, [e.id for e in events]) if user and events else {}
 
-    favorite_ids = (
-        {f.event_id for f in db.query(Favorite.event_id).filter(Favorite.user_id == user.id).all()}
-        if user else set()
-    )
-    ticket_ids = (
-        {t.event_id for t in db.query(Ticket.event_id).filter(Ticket.user_id == user.id).all()}
-        if user else set()
+    next_cursor = encode_cursor(events[-1].id) if has_more and events else None
+    no_flags = (False, False)
+    return render_page(
+        rubric, total, offset, limit,
+        [(fragments.get(catalog_version, e), *flags.get(e.id, no_flags)) for e in events],
+        next_cursor, headers,
     )
 
-    event_list = [
-        EventOut(
-            id=e.id,
-            title=e.title,
-            image_url=e.image_url,
-            details=e.details,
-            price=e.price,
-            rating=e.rating,
-            archived=e.archived,
-            is_favorite=e.id in favorite_ids,
-            is_ticket=e.id in ticket_ids,
-        )
-        for e in events
-    ]
-
-    return PaginatedEvents(rubric=(rubric or "all"), offset=offset, limit=limit, total=total, events=event_list)
+
+@router.get("/search", response_model=PaginatedEvents)
+async def search_events(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    rubric: Optional[str] = None,
+    offset: int = Query(0, ge=0, le=INT_MAX),
+    limit: int = Query(12, ge=1, le=50),
+    cursor: Optional[str] = None,
+    user: Optional[UserIdentity] = Depends(get_optional_identity),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Full-text search over titles and details, best matches first.
+    Results are ranked, so next_cursor carries the next offset.
+    """
+    if not search_supported(db.get_bind()):
+        raise HTTPException(status_code=501, detail="Search is not available")
+    after_offset = decode_cursor(cursor, int, minimum=0)
+    if after_offset is not None:
+        offset = after_offset
+
+    # conditional request: catalog version (+ user state version)
+    snapshot = catalog.snapshot
+    catalog_version = snapshot.version if snapshot is not None else await db.run_sync(get_catalog_version)
+    if user:
+        user_version = await db.run_sync(get_user_state_version, user.id)
+        etag, cache_control = make_etag(f"c{catalog_version}", f"u{user.id}.{user_version}"), "private, no-cache"
+    else:
+        etag, cache_control = make_etag(f"c{catalog_version}"), "no-cache"
+    cached = not_modified(request, etag, cache_control)
+    if cached:
+        return cached
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Authorization"}
+
+    match = match_expression(q)
+    if match is None:
+        return render_page(rubric, 0, offset, limit, [], None, headers)
+
+    query = search_query(match, rubric)
+    total = await db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+    ids = (await db.scalars(query.offset(offset).limit(limit))).all()
+    found = {e.id: e for e in await db.scalars(select(Event).where(Event.id.in_(ids)))} if ids else {}
+    events = [found[i] for i in ids if i in found]
+
+    flags = await db.run_sync(membership.lookup, user.id, user_version, [e.id for e in events]) if user and events else {}
+
+    next_cursor = encode_cursor(offset + limit) if offset + limit < total else None
+    no_flags = (False, False)
+    return render_page(
+        rubric, total, offset, limit,
+        [(fragments.get(catalog_version, e), *flags.get(e.id, no_flags)) for e in events],
+        next_cursor, headers,
+    )
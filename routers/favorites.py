@@ -1,85 +1,120 @@
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from database import SessionLocal
-from models import EventRubric, Rubric, Favorite, Event, User
-from utils.security import get_current_user
-from schemas import PaginatedEvents, EventOut
+from database import AsyncSessionLocal
+from models import EventRubric, Rubric, Favorite, Event
+from utils.security import get_current_identity, UserIdentity
+from schemas import PaginatedEvents
+from utils.pagination import INT_MAX, encode_cursor, decode_cursor
+from services.membership import membership
+from services.catalog import catalog, get_catalog_version
+from services.rubric_counts import rubric_counts
+from services.fragments import fragments, render_page
+from services.user_state import get_user_state_version, bump_user_state
+from services.writer import writer
+from utils.etag import make_etag, not_modified
 
 
 router = APIRouter(prefix="/api/favorites", tags=["favorites"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def favorites_query(user_id: int, rubric: Optional[str] = None):
+    """
+    Active favorite events of the user as (Event, Favorite.id) rows.
+    """
+    query = (
+        select(Event, Favorite.id)
+        .join(Favorite, Favorite.event_id == Event.id)
+        .where(Favorite.user_id == user_id, Event.archived == False)
+    )
+    if rubric:
+        query = query.join(EventRubric, EventRubric.event_id == Event.id).join(Rubric).where(Rubric.code == rubric)
+    return query
 
 
 @router.get("/", response_model=PaginatedEvents)
-def get_favorites(
+async def get_favorites(
+    request: Request,
     rubric: Optional[str] = None,
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, le=INT_MAX),
     limit: int = Query(12, ge=1, le=50),
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    with_total: bool = False,
+    user: UserIdentity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(Event).filter(Event.archived == False)
+    after_key = decode_cursor(cursor, int)
+
+    # conditional request: catalog version + user state version
+    snapshot = catalog.snapshot
+    catalog_version = snapshot.version if snapshot is not None else await db.run_sync(get_catalog_version)
+    user_version = await db.run_sync(get_user_state_version, user.id)
+    etag = make_etag(f"c{catalog_version}", f"u{user.id}.{user_version}")
+    cached = not_modified(request, etag, "private, no-cache")
+    if cached:
+        return cached
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    query = favorites_query(user.id, rubric)
+    total = await db.scalar(select(func.count()).select_from(query.subquery())) if after_key is None or with_total else None
+    query = query.order_by(Favorite.id.desc())
+    if after_key is not None:
+        query = query.where(Favorite.id < after_key)
+    else:
+        query = query.offset(offset)
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = encode_cursor(rows[-1][1]) if has_more and rows else None
+    return render_page(
+        rubric, total, offset, limit,
+        [(fragments.get(catalog_version, e), True, False) for e, _ in rows],
+        next_cursor, headers,
+    )
+
+
+def _add_favorite(db: Session, user_id: int, event_id: str) -> int:
+    if db.scalar(select(Favorite.id).filter_by(user_id=user_id, event_id=event_id)):
+        raise HTTPException(status_code=400, detail="Already in favorites")
+    db.add(Favorite(user_id=user_id, event_id=event_id))
+    return bump_user_state(db, user_id)
 
-    if rubric:
-        query = query.join(EventRubric).join(Rubric).filter(Rubric.code == rubric)
-    
-    query = query.join(Favorite, Favorite.event_id == Event.id).filter(Favorite.user_id == user.id).order_by(Favorite.id.desc())
-    
-    total = query.count()
-    events = query.offset(offset).limit(limit).all()
-
-    event_list = [
-        EventOut(
-            id=e.id,
-            title=e.title,
-            image_url=e.image_url,
-            details=e.details,
-            price=e.price,
-            rating=e.rating,
-            archived=e.archived,
-            is_favorite=True,
-        )
-        for e in events
-    ]
-
-    return PaginatedEvents(rubric=(rubric or "all"), offset=offset, limit=limit, total=total, events=event_list)
+
+def _remove_favorite(db: Session, user_id: int, event_id: str) -> int:
+    fav = db.scalar(select(Favorite).filter_by(user_id=user_id, event_id=event_id))
+    if not fav:
+        raise HTTPException(status_code=404, detail="Not found")
+    db.delete(fav)
+    return bump_user_state(db, user_id)
 
 
 @router.post("/{event_id}")
-def add_favorite(
+async def add_favorite(
     event_id: str, 
-    user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    user: UserIdentity = Depends(get_current_identity)
 ):
-    if db.query(Favorite).filter_by(user_id=user.id, event_id=event_id).first():
-        raise HTTPException(status_code=400, detail="Already in favorites")
-
-    fav = Favorite(user_id=user.id, event_id=event_id)
-    db.add(fav)
-    db.commit()
+    version = await writer.submit(_add_favorite, user.id, event_id)
+    membership.invalidate(user.id)
+    rubric_counts.record(user.id, version, event_id, favorites=1)
     return {"message": "Added to favorites"}
 
 
 @router.delete("/{event_id}")
-def remove_favorite(
+async def remove_favorite(
     event_id: str, 
-    user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+    user: UserIdentity = Depends(get_current_identity)
 ):
-    fav = db.query(Favorite).filter_by(user_id=user.id, event_id=event_id).first()
-    if not fav:
-        raise HTTPException(status_code=404, detail="Not found")
-
-    db.delete(fav)
-    db.commit()
+    version = await writer.submit(_remove_favorite, user.id, event_id)
+    membership.invalidate(user.id)
+    rubric_counts.record(user.id, version, event_id, favorites=-1)
     return {"message": "Removed from favorites"}
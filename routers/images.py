@@ -0,0 +1,57 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from models import Event
+from services.catalog import catalog
+from services.image_proxy import image_key, image_proxy
+from utils.etag import make_etag, not_modified
+
+
+router = APIRouter(prefix="/api/images", tags=["images"])
+
+# the url of an event image may change with a feed update, thumbnails of one url never do
+CACHE_CONTROL = "public, max-age=86400"
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def _image_url(db: AsyncSession, event_id: str) -> Optional[str]:
+    snapshot = catalog.snapshot
+    if snapshot is not None:
+        position = snapshot.positions.get(event_id)
+        if position is not None:
+            return snapshot.events[position].image_url
+    # archived events and catalog not loaded yet
+    event = await db.get(Event, event_id)
+    return event.image_url if event else None
+
+
+@router.get("/{event_id}")
+async def get_event_image(
+    request: Request,
+    event_id: str,
+    size: Optional[int] = Query(None, ge=1, le=2048),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    WebP thumbnail of the event image: the smallest thumbnail size not smaller than size.
+    """
+    image_url = await _image_url(db, event_id)
+    if not image_url:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    size = image_proxy.variant(size)
+    etag = make_etag(image_key(image_url), size)
+    cached = not_modified(request, etag, CACHE_CONTROL)
+    if cached:
+        return cached
+
+    path = await image_proxy.thumbnail(image_url, size)
+    return FileResponse(path, media_type="image/webp", headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
@@ -0,0 +1,54 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from schemas import RubricList, RubricOut
+from utils.security import get_optional_identity, UserIdentity
+from services.catalog import catalog, get_catalog_version
+from services.rubric_counts import rubric_counts
+from services.user_state import get_user_state_version
+from utils.etag import make_etag, not_modified
+
+
+router = APIRouter(prefix="/api/rubrics", tags=["rubrics"])
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+@router.get("/", response_model=RubricList)
+async def get_rubrics(
+    request: Request,
+    response: Response,
+    user: Optional[UserIdentity] = Depends(get_optional_identity),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Every rubric with its number of active events (+ the user's favorites/tickets in it).
+    """
+    snapshot = catalog.snapshot
+    catalog_version = snapshot.version if snapshot is not None else await db.run_sync(get_catalog_version)
+    if user:
+        user_version = await db.run_sync(get_user_state_version, user.id)
+        etag, cache_control = make_etag(f"c{catalog_version}", f"u{user.id}.{user_version}"), "private, no-cache"
+    else:
+        etag, cache_control = make_etag(f"c{catalog_version}"), "no-cache"
+    cached = not_modified(request, etag, cache_control)
+    if cached:
+        return cached
+    response.headers.update({"ETag": etag, "Cache-Control": cache_control, "Vary": "Authorization"})
+
+    counts = await db.run_sync(rubric_counts.catalog_counts, catalog_version)
+    if not user:
+        return RubricList(rubrics=[RubricOut(code=code, events=events) for code, events in counts])
+
+    user_counts = await db.run_sync(rubric_counts.user_counts, user.id, catalog_version, user_version)
+    rubrics = []
+    for code, events in counts:
+        favorites, tickets = user_counts.get(code, (0, 0))
+        rubrics.append(RubricOut(code=code, events=events, favorites=favorites, tickets=tickets))
+    return RubricList(rubrics=rubrics)
@@ -1,75 +1,110 @@
-from typing import Optional
+from typing import Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from database import SessionLocal
-from models import Ticket, Favorite, Event, User, Rubric, EventRubric
-from utils.security import get_current_user
-from schemas import PaginatedEvents, EventOut
+from database import AsyncSessionLocal
+from models import Ticket, Favorite, Event, Rubric, EventRubric
+from utils.security import get_current_identity, UserIdentity
+from schemas import PaginatedEvents
+from utils.pagination import INT_MAX, encode_cursor, decode_cursor
+from services.membership import membership
+from services.rubric_counts import rubric_counts
+from services.catalog import catalog, get_catalog_version
+from services.fragments import fragments, render_page
+from services.user_state import get_user_state_version, bump_user_state
+from services.writer import writer
+from utils.etag import make_etag, not_modified
 
 
 router = APIRouter(prefix="/api/tickets", tags=["tickets"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-@router.get("/", response_model=PaginatedEvents)
-def get_tickets(
-    rubric: Optional[str] = None,
-    offset: int = Query(0, ge=0),
-    limit: int = Query(12, ge=1, le=50),
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    query = db.query(Event).filter(Event.archived == False)
-
+def tickets_query(user_id: int, rubric: Optional[str] = None):
+    """
+    Active events the user has tickets for as (Event, Ticket.id) rows.
+    """
+    query = (
+        select(Event, Ticket.id)
+        .join(Ticket, Ticket.event_id == Event.id)
+        .where(Ticket.user_id == user_id, Event.archived == False)
+    )
     if rubric:
-        query = query.join(EventRubric).join(Rubric).filter(Rubric.code == rubric)
-   
-    query = query.join(Ticket, Ticket.event_id == Event.id).filter(Ticket.user_id == user.id)
-
-    total = query.count()
-    events = query.offset(offset).limit(limit).all()
-
-    event_list = [
-        EventOut(
-            id=e.id,
-            title=e.title,
-            image_url=e.image_url,
-            details=e.details,
-            price=e.price,
-            rating=e.rating,
-            archived=e.archived,
-            is_ticket=True,
-        )
-        for e in events
-    ]
-
-    return PaginatedEvents(rubric=(rubric or "all"), offset=offset, limit=limit, total=total, events=event_list)
+        query = query.join(EventRubric, EventRubric.event_id == Event.id).join(Rubric).where(Rubric.code == rubric)
+    return query
 
 
-@router.post("/{event_id}")
-def buy_ticket(
-    event_id: str, 
-    user: User = Depends(get_current_user), 
-    db: Session = Depends(get_db)
+@router.get("/", response_model=PaginatedEvents)
+async def get_tickets(
+    request: Request,
+    rubric: Optional[str] = None,
+    offset: int = Query(0, ge=0, le=INT_MAX),
+    limit: int = Query(12, ge=1, le=50),
+    cursor: Optional[str] = None,
+    with_total: bool = False,
+    user: UserIdentity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_db)
 ):
-    if db.query(Ticket).filter_by(user_id=user.id, event_id=event_id).first():
+    after_key = decode_cursor(cursor, int)
+
+    # conditional request: catalog version + user state version
+    snapshot = catalog.snapshot
+    catalog_version = snapshot.version if snapshot is not None else await db.run_sync(get_catalog_version)
+    user_version = await db.run_sync(get_user_state_version, user.id)
+    etag = make_etag(f"c{catalog_version}", f"u{user.id}.{user_version}")
+    cached = not_modified(request, etag, "private, no-cache")
+    if cached:
+        return cached
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    query = tickets_query(user.id, rubric)
+    total = await db.scalar(select(func.count()).select_from(query.subquery())) if after_key is None or with_total else None
+    query = query.order_by(Ticket.id)
+    if after_key is not None:
+        query = query.where(Ticket.id > after_key)
+    else:
+        query = query.offset(offset)
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = encode_cursor(rows[-1][1]) if has_more and rows else None
+    return render_page(
+        rubric, total, offset, limit,
+        [(fragments.get(catalog_version, e), False, True) for e, _ in rows],
+        next_cursor, headers,
+    )
+
+
+def _buy_ticket(db: Session, user_id: int, event_id: str) -> Tuple[int, bool]:
+    """
+    Returns the new user state version and whether a favorite was replaced.
+    """
+    if db.scalar(select(Ticket.id).filter_by(user_id=user_id, event_id=event_id)):
         raise HTTPException(status_code=400, detail="Already purchased")
 
-    ticket = Ticket(user_id=user.id, event_id=event_id)
-    db.add(ticket)
+    db.add(Ticket(user_id=user_id, event_id=event_id))
 
-    fav = db.query(Favorite).filter_by(user_id=user.id, event_id=event_id).first()
+    fav = db.scalar(select(Favorite).filter_by(user_id=user_id, event_id=event_id))
     if fav:
         db.delete(fav)
 
-    db.commit()
+    return bump_user_state(db, user_id), fav is not None
+
+
+@router.post("/{event_id}")
+async def buy_ticket(
+    event_id: str, 
+    user: UserIdentity = Depends(get_current_identity)
+):
+    version, had_favorite = await writer.submit(_buy_ticket, user.id, event_id)
+    membership.invalidate(user.id)
+    rubric_counts.record(user.id, version, event_id, favorites=-1 if had_favorite else 0, tickets=1)
     return {"message": "Ticket purchased"}
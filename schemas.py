@@ -1,6 +1,8 @@
-from typing import Optional, List
+from typing import Dict, Optional, List
 
-from pydantic import BaseModel, EmailStr, ConfigDict, field_validator
+from pydantic import BaseModel, EmailStr, ConfigDict, field_validator, model_validator
+
+from services.avatars import avatar_links
 
 
 class Token(BaseModel):
@@ -44,7 +46,15 @@ class UserCreate(BaseModel):
 
 
 class UserOut(UserBase):
-    pass
+    # avatar_url: largest variant; avatar_variants: size (px) -> URL
+    avatar_variants: Dict[int, str] = {}
+
+    @model_validator(mode="after")
+    def link_avatar(self):
+        # stored file name -> URLs; a response model validates its dump again, URLs stay
+        if self.avatar_url and not self.avatar_url.startswith("/"):
+            self.avatar_url, self.avatar_variants = avatar_links(self.id, self.avatar_url)
+        return self
 
 
 class AuthResponse(Token):
@@ -67,7 +77,19 @@ class EventOut(BaseModel):
 
 class PaginatedEvents(BaseModel):
     rubric: str
-    total: int
+    total: Optional[int] = None  # omitted for cursor pages unless requested
     offset: int
     limit: int
     events: List[EventOut]
+    next_cursor: Optional[str] = None
+
+
+class RubricOut(BaseModel):
+    code: str
+    events: int
+    favorites: Optional[int] = None  # authenticated requests only
+    tickets: Optional[int] = None
+
+
+class RubricList(BaseModel):
+    rubrics: List[RubricOut]
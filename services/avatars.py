@@ -0,0 +1,201 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile, status
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import User
+from services.image_pool import image_pool
+from utils.etag import make_etag
+from utils.image_utils import make_avatar_variants, variant_name
+
+
+READ_SIZE = 64 * 1024
+_AVATAR_KEY = re.compile(r"([0-9a-f]{32})\.webp")
+_VARIANT_NAME = re.compile(r"([0-9a-f]{32})_(\d+)\.webp")
+
+
+async def read_upload(upload: UploadFile, limit: int) -> bytes:
+    """
+    Read an uploaded file in chunks, answering 413 as soon as it exceeds limit bytes.
+    """
+    if upload.size is not None and upload.size > limit:
+        raise _too_large(limit)
+    chunks, total = [], 0
+    while chunk := await upload.read(READ_SIZE):
+        total += len(chunk)
+        if total > limit:
+            raise _too_large(limit)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _too_large(limit: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Avatar must be at most {limit // (1024 * 1024)} MB",
+    )
+
+
+async def process_avatar(data: bytes) -> str:
+    """
+    Save the WebP variants of an uploaded image (content addressed,
+    <key>_<size>.webp), return the value for User.avatar_url ("<key>.webp").
+    """
+    try:
+        key = await image_pool.run(make_avatar_variants, data, settings.UPLOAD_DIR, tuple(settings.AVATAR_SIZES))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    return f"{key}.webp"
+
+
+def remove_avatar(avatar_url: str) -> None:
+    """
+    Delete the variant files of an avatar (blocking). Variants are content
+    addressed: only call it for an avatar no user refers to.
+    """
+    match = _AVATAR_KEY.fullmatch(avatar_url)
+    if match is None:
+        return
+    for size in settings.AVATAR_SIZES:
+        try:
+            os.remove(os.path.join(settings.UPLOAD_DIR, variant_name(match.group(1), size)))
+        except FileNotFoundError:
+            pass
+
+
+def avatar_links(user_id: int, avatar_url: str) -> Tuple[str, Dict[int, str]]:
+    """
+    URLs of an avatar for user payloads: (largest variant, {size: variant}).
+    Variant URLs are content addressed and cacheable forever; avatars saved
+    before variants existed only have the per-user URL.
+    """
+    match = _AVATAR_KEY.fullmatch(avatar_url)
+    if match is None:
+        return f"/api/avatars/{user_id}", {}
+    variants = {size: f"/api/avatars/files/{variant_name(match.group(1), size)}" for size in sorted(settings.AVATAR_SIZES)}
+    return variants[max(variants)], variants
+
+
+def avatar_file(avatar_url: str, size: Optional[int] = None) -> str:
+    """
+    Path of the avatar file to serve: the smallest variant not smaller than
+    size (largest if size is not given). Avatars saved before variants
+    existed are served as they are.
+    """
+    match = _AVATAR_KEY.fullmatch(avatar_url)
+    if match is None:
+        return os.path.join(settings.UPLOAD_DIR, avatar_url)
+    sizes = sorted(settings.AVATAR_SIZES)
+    chosen = next((s for s in sizes if size is not None and s >= size), sizes[-1])
+    return os.path.join(settings.UPLOAD_DIR, variant_name(match.group(1), chosen))
+
+
+def is_variant_name(name: str) -> bool:
+    return _VARIANT_NAME.fullmatch(name) is not None
+
+
+class AvatarIndex:
+    """
+    user id -> avatar_url, so serving an avatar needs no users query.
+    Loaded once (users with an avatar) and updated on register. Ids above
+    the largest id seen at load time may belong to users registered by
+    another worker: those are unknown and looked up in the database.
+    """
+
+    def __init__(self):
+        self._urls: Dict[int, Optional[str]] = {}
+        self._max_id: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._max_id is not None
+
+    def load(self, db: Session) -> None:
+        rows = db.execute(select(User.id, User.avatar_url).where(User.avatar_url.is_not(None))).all()
+        max_id = db.scalar(select(func.max(User.id))) or 0
+        with self._lock:
+            for user_id, avatar_url in rows:
+                self._urls.setdefault(user_id, avatar_url)
+            self._max_id = max(max_id, self._max_id or 0)
+
+    def lookup(self, user_id: int) -> Tuple[bool, Optional[str]]:
+        """
+        (known, avatar_url); known users without avatar have avatar_url None.
+        """
+        avatar_url = self._urls.get(user_id)
+        if avatar_url is not None or user_id in self._urls:
+            return True, avatar_url
+        return self._max_id is not None and user_id <= self._max_id, None
+
+    def set(self, user_id: int, avatar_url: Optional[str]) -> None:
+        with self._lock:
+            self._urls[user_id] = avatar_url
+
+    def discard(self, user_id: int) -> None:
+        with self._lock:
+            self._urls.pop(user_id, None)
+
+
+class AvatarFileCache:
+    """
+    LRU of small avatar files (path -> (etag, bytes)), bounded by total size.
+    Files larger than max_file_bytes keep only their etag.
+    """
+
+    def __init__(self, max_bytes: int, max_file_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self._files: "OrderedDict[str, Tuple[str, Optional[bytes]]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> Optional[Tuple[str, Optional[bytes]]]:
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None:
+                self._files.move_to_end(path)
+            return entry
+
+    def load(self, path: str) -> Tuple[str, Optional[bytes]]:
+        """
+        Read a file into the cache (blocking). Raises FileNotFoundError.
+        """
+        name = os.path.basename(path)
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            # content-addressed names are strong validators by themselves
+            etag = make_etag(name) if is_variant_name(name) else make_etag(f"{stat.st_mtime_ns:x}", f"{stat.st_size:x}")
+            data = f.read() if stat.st_size <= self.max_file_bytes else None
+        with self._lock:
+            previous = self._files.pop(path, None)
+            if previous is not None and previous[1] is not None:
+                self._size -= len(previous[1])
+            self._files[path] = (etag, data)
+            if data is not None:
+                self._size += len(data)
+            while self._size > self.max_bytes and self._files:
+                _, (_, evicted) = self._files.popitem(last=False)
+                if evicted is not None:
+                    self._size -= len(evicted)
+        return etag, data
+
+
+avatar_index = AvatarIndex()
+avatar_cache = AvatarFileCache(settings.AVATAR_CACHE_BYTES, settings.AVATAR_CACHE_FILE_BYTES)
+
+
+@event.listens_for(User, "after_update")
+def _update_avatar_index(mapper, connection, target):
+    avatar_index.set(target.id, target.avatar_url)
+
+
+@event.listens_for(User, "after_delete")
+def _drop_from_avatar_index(mapper, connection, target):
+    avatar_index.discard(target.id)
@@ -0,0 +1,144 @@
+import logging
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from operator import attrgetter
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from models import Event, EventRubric, ImportRun, Rubric
+
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogEvent(NamedTuple):
+    id: str
+    title: str
+    image_url: Optional[str]
+    rating: Optional[float]
+    price: Optional[str]
+    details: Optional[str]
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """
+    Immutable view of the active catalog for one catalog version.
+    Events are ordered by id, rubrics hold sorted positions into events.
+    """
+    version: int
+    events: List[CatalogEvent]
+    positions: Dict[str, int]  # event id -> position
+    rubrics: Dict[str, array]  # rubric code -> sorted positions
+
+    def select(self, rubric: Optional[str] = None, ids: Optional[Sequence[str]] = None) -> Sequence[int]:
+        """
+        Positions of active events matching the filters, in catalog order.
+        """
+        rubric_positions = None
+        if rubric:
+            rubric_positions = self.rubrics.get(rubric)
+            if rubric_positions is None:
+                return []
+        if ids is None:
+            return rubric_positions if rubric_positions is not None else range(len(self.events))
+
+        found = sorted({self.positions[i] for i in ids if i in self.positions})
+        if rubric_positions is not None:
+            found = [p for p in found if _contains(rubric_positions, p)]
+        return found
+
+    def seek(self, positions: Sequence[int], after_id: str) -> int:
+        """
+        Index in positions of the first event with id greater than after_id.
+        """
+        first = bisect_right(self.events, after_id, key=attrgetter("id"))
+        return bisect_left(positions, first)
+
+    def page(self, positions: Sequence[int], start: int, limit: int) -> List[CatalogEvent]:
+        return [self.events[p] for p in positions[start:start + limit]]
+
+    def rubrics_of(self, event_id: str) -> List[str]:
+        """
+        Rubric codes of an active event (empty if the event is not in the catalog).
+        """
+        position = self.positions.get(event_id)
+        if position is None:
+            return []
+        return [code for code, positions in self.rubrics.items() if _contains(positions, position)]
+
+
+def _contains(sorted_positions: array, position: int) -> bool:
+    i = bisect_left(sorted_positions, position)
+    return i < len(sorted_positions) and sorted_positions[i] == position
+
+
+def get_catalog_version(db: Session) -> int:
+    """
+    Catalog version = id of the last import run (0 if nothing was imported).
+    """
+    return db.scalar(select(func.max(ImportRun.id))) or 0
+
+
+class Catalog:
+    """
+    In-process catalog of active events, reloaded when the catalog version changes.
+    Readers take the current snapshot once per request; reload swaps it atomically.
+    """
+
+    def __init__(self):
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> Optional[CatalogSnapshot]:
+        return self._snapshot
+
+    @property
+    def version(self) -> Optional[int]:
+        snapshot = self._snapshot
+        return snapshot.version if snapshot else None
+
+    def reload(self, db: Session, force: bool = False) -> bool:
+        """
+        Load the catalog if its version changed, return True if a new snapshot was installed.
+        """
+        with self._lock:
+            version = get_catalog_version(db)
+            if not force and self._snapshot is not None and self._snapshot.version == version:
+                return False
+            snapshot = self._build(db, version)
+            self._snapshot = snapshot
+        logger.info(f"Catalog version {version} loaded: {len(snapshot.events)} events, {len(snapshot.rubrics)} rubrics")
+        return True
+
+    @staticmethod
+    def _build(db: Session, version: int) -> CatalogSnapshot:
+        events = [
+            CatalogEvent(*row)
+            for row in db.execute(
+                select(Event.id, Event.title, Event.image_url, Event.rating, Event.price, Event.details)
+                .where(Event.archived == False)
+                .order_by(Event.id)
+            )
+        ]
+        positions = {e.id: p for p, e in enumerate(events)}
+
+        rubrics: Dict[str, array] = {}
+        for event_id, code in db.execute(
+            select(EventRubric.event_id, Rubric.code).join(Rubric, Rubric.id == EventRubric.rubric_id)
+        ):
+            position = positions.get(event_id)
+            if position is not None:
+                rubrics.setdefault(code, array("i")).append(position)
+        for code, rubric_positions in rubrics.items():
+            rubrics[code] = array("i", sorted(rubric_positions))
+
+        return CatalogSnapshot(version=version, events=events, positions=positions, rubrics=rubrics)
+
+
+catalog = Catalog()
@@ -1,9 +1,87 @@
-import os, glob, json
+import os, glob, json, time, hashlib, logging
+from dataclasses import dataclass
+from datetime import datetime
 from typing import Optional
 
+from sqlalchemy import Column, Float, MetaData, String, Table, Text, and_, delete, exists, false, func, or_, select, true, update
 from sqlalchemy.orm import Session
 
-from models import Event, EventRubric, Rubric
+from models import Event, EventHash, EventRubric, ImportRun, Rubric
+from services.rubric_counts import count_rubric_events
+from services.search import sync_search_index
+from utils.json_stream import iter_object_items
+from utils.metrics import registry
+from utils.query_plan import update_statistics
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500  # rows per statement (keep below sqlite bound-variable limit)
+CHUNK_SIZE = 5000  # events per chunk (and per commit in streaming mode)
+
+import_runs = registry.counter("import_runs_total", "Feed imports by result (imported, skipped, failed)")
+import_seconds = registry.histogram(
+    "import_duration_seconds", "Duration of feed imports", buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+import_events = registry.counter("import_events_total", "Events of imported feeds by outcome")
+last_import_events = registry.gauge("import_last_events", "Events of the last imported feed by outcome")
+last_import_time = registry.gauge("import_last_success_timestamp_seconds", "End of the last successful import")
+
+
+# -----------------------------
+# Shadow catalog, built per import run.
+# Temporary tables live in the connection's temp database,
+# so filling them takes no locks on the live catalog.
+# -----------------------------
+_shadow = MetaData()
+
+_import_events = Table(
+    "import_events", _shadow,
+    Column("id", String(24), primary_key=True),
+    Column("title", String),
+    Column("image_url", String),
+    Column("rating", Float),
+    Column("price", String),
+    Column("details", Text),
+    Column("content_hash", String(64), nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+_import_event_rubrics = Table(
+    "import_event_rubrics", _shadow,
+    Column("event_id", String(24), primary_key=True),
+    Column("code", String(32), primary_key=True),
+    prefixes=["TEMPORARY"],
+)
+
+# events of the file which are new or whose payload changed
+_import_changed = Table(
+    "import_changed", _shadow,
+    Column("id", String(24), primary_key=True),
+    prefixes=["TEMPORARY"],
+)
+
+# events whose full-text index rows change: changed, archived and un-archived ones
+_import_reindexed = Table(
+    "import_reindexed", _shadow,
+    Column("id", String(24), primary_key=True),
+    prefixes=["TEMPORARY"],
+)
+
+
+@dataclass
+class ImportStats:
+    events: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    archived: int = 0
+    unarchived: int = 0
+    rubrics_created: int = 0
+    links_added: int = 0
+    links_removed: int = 0
+    duration: float = 0.0
+    skipped: bool = False
 
 
 def get_latest_data_file(data_dir: str) -> Optional[str]:
@@ -19,54 +97,301 @@ def _to_float_or_none(value):
         return None
 
 
-def load_events_from_json(db: Session, filepath: str) -> None:
+def _insert(db: Session):
+    """
+    Dialect specific INSERT supporting ON CONFLICT (sqlite / postgresql).
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def _batches(items, size: int = BATCH_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _event_row(event_id: str, payload: dict) -> dict:
+    return {
+        "id": event_id,
+        "title": payload.get("title"),
+        "image_url": payload.get("image_url"),
+        "rating": _to_float_or_none(payload.get("rating")),
+        "price": payload.get("price"),
+        "details": payload.get("details"),
+        "content_hash": _payload_hash(payload),
+    }
+
+
+def _rubric_codes(payload: dict) -> set:
+    codes = set()
+    for code in payload.get("rubrics", []):
+        code = str(code).strip()
+        if code: codes.add(code)
+    return codes
+
+
+def _payload_hash(payload) -> str:
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+
+def _file_hash(filepath: str) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _iter_feed(filepath: str, stream: bool):
     with open(filepath, "r", encoding="utf-8") as f:
+        if stream:
+            yield from iter_object_items(f)
+            return
         data = json.load(f)
-
     if not isinstance(data, dict):
         raise ValueError("Expected JSON object mapping event_id -> event_data")
+    yield from data.items()
+
+
+def _chunks(items, size: int):
+    """
+    Group (event_id, payload) pairs into dicts of up to size events (last duplicate wins).
+    """
+    chunk = {}
+    for event_id, payload in items:
+        chunk[event_id] = payload
+        if len(chunk) >= size:
+            yield chunk
+            chunk = {}
+    if chunk:
+        yield chunk
+
+
+def _stage_chunk(db: Session, chunk: dict) -> None:
+    for event_id, payload in chunk.items():
+        if not isinstance(payload, dict):
+            raise ValueError(f"Invalid feed: payload of event {event_id!r} is not an object")
+
+    stmt = _insert(db)(_import_events)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["id"],
+        set_={c.name: stmt.excluded[c.name] for c in _import_events.columns if c.name != "id"},
+    )
+    for batch in _batches(chunk.items()):
+        db.execute(stmt, [_event_row(event_id, payload) for event_id, payload in batch])
+        # an id repeated in an earlier chunk: its last payload wins
+        db.execute(delete(_import_event_rubrics).where(_import_event_rubrics.c.event_id.in_([e for e, _ in batch])))
+
+    links = [
+        {"event_id": event_id, "code": code}
+        for event_id, payload in chunk.items()
+        for code in sorted(_rubric_codes(payload))
+    ]
+    for batch in _batches(links):
+        db.execute(_import_event_rubrics.insert(), batch)
+
+
+def _validate_shadow(db: Session) -> int:
+    """
+    Check the shadow catalog before it goes live, return its size.
+    Structural problems reject the import, a bad rubric code only drops that rubric of the event.
+    """
+    untitled = db.scalar(select(func.count()).select_from(_import_events).where(_import_events.c.title.is_(None)))
+    if untitled:
+        raise ValueError(f"Invalid feed: {untitled} events without title")
+    too_long = db.execute(
+        delete(_import_event_rubrics).where(func.length(_import_event_rubrics.c.code) > 32)
+    ).rowcount
+    if too_long:
+        logger.warning(f"Dropped {too_long} event rubrics with codes longer than 32 characters")
+    return db.scalar(select(func.count()).select_from(_import_events))
+
+
+def _swap_in(db: Session, stats: ImportStats) -> None:
+    """
+    Merge the shadow catalog into the live tables. Runs as set-based statements
+    inside one transaction, so readers see either the old or the new catalog.
+    """
+    events, hashes, rubrics, links = Event.__table__, EventHash.__table__, Rubric.__table__, EventRubric.__table__
+    ie, ier, changed, reindexed = _import_events, _import_event_rubrics, _import_changed, _import_reindexed
+    insert = _insert(db)
+
+    db.execute(changed.insert().from_select(
+        ["id"],
+        select(ie.c.id)
+        .outerjoin(hashes, hashes.c.event_id == ie.c.id)
+        .where(or_(hashes.c.content_hash.is_(None), hashes.c.content_hash != ie.c.content_hash)),
+    ))
+    changed_count = db.scalar(select(func.count()).select_from(changed))
+    stats.inserted = db.scalar(
+        select(func.count()).select_from(changed).where(changed.c.id.not_in(select(events.c.id)))
+    )
+    stats.updated = changed_count - stats.inserted
+    stats.unchanged = stats.events - changed_count
+
+    # rubrics
+    stats.rubrics_created = db.execute(rubrics.insert().from_select(
+        ["code"],
+        select(ier.c.code).distinct().where(ier.c.code.not_in(select(rubrics.c.code))),
+    )).rowcount
+
+    # events + content hashes of changed events
+    columns = ["id", "title", "image_url", "rating", "price", "details"]
+    stmt = insert(events).from_select(
+        columns + ["archived"],
+        select(*(ie.c[c] for c in columns), false()).where(ie.c.id.in_(select(changed.c.id))),
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["id"],
+        set_={c: stmt.excluded[c] for c in columns[1:] + ["archived"]},
+    ))
+    stmt = insert(hashes).from_select(
+        ["event_id", "content_hash"],
+        select(ie.c.id, ie.c.content_hash).where(ie.c.id.in_(select(changed.c.id))),
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=["event_id"],
+        set_={"content_hash": stmt.excluded.content_hash},
+    ))
+
+    # rubric links of changed events
+    stats.links_removed = db.execute(delete(links).where(
+        links.c.event_id.in_(select(changed.c.id)),
+        ~exists().where(
+            ier.c.event_id == links.c.event_id,
+            ier.c.code == rubrics.c.code,
+            rubrics.c.id == links.c.rubric_id,
+        ),
+    )).rowcount
+    stats.links_added = db.execute(links.insert().from_select(
+        ["event_id", "rubric_id"],
+        select(ier.c.event_id, rubrics.c.id)
+        .join(rubrics, rubrics.c.code == ier.c.code)
+        .where(
+            ier.c.event_id.in_(select(changed.c.id)),
+            ~exists().where(and_(links.c.event_id == ier.c.event_id, links.c.rubric_id == rubrics.c.id)),
+        ),
+    )).rowcount
+
+    # index rows to rebuild: changed events (active already), returned and old ones
+    db.execute(reindexed.insert().from_select(["id"], select(changed.c.id)))
+    db.execute(reindexed.insert().from_select(
+        ["id"],
+        select(events.c.id).where(events.c.archived == true(), events.c.id.in_(select(ie.c.id))),
+    ))
+    if stats.events:
+        db.execute(reindexed.insert().from_select(
+            ["id"],
+            select(events.c.id).where(events.c.archived == false(), events.c.id.not_in(select(ie.c.id))),
+        ))
+
+    # un-archive returned events, archivate old ones
+    stats.unarchived = db.execute(
+        update(events).where(events.c.archived == true(), events.c.id.in_(select(ie.c.id))).values(archived=False)
+    ).rowcount
+    if stats.events:
+        stats.archived = db.execute(
+            update(events).where(events.c.archived == false(), events.c.id.not_in(select(ie.c.id))).values(archived=True)
+        ).rowcount
+
+    # rubric counts + full-text index
+    count_rubric_events(db)
+    sync_search_index(db, select(reindexed.c.id))
+
+
+def _record_import(stats: ImportStats) -> None:
+    import_runs.inc(labels={"result": "imported"})
+    import_seconds.observe(stats.duration)
+    for outcome in ("inserted", "updated", "unchanged", "archived", "unarchived"):
+        count = getattr(stats, outcome)
+        import_events.inc(count, {"outcome": outcome})
+        last_import_events.set(count, {"outcome": outcome})
+    last_import_time.set(time.time())
+
+
+def load_events_from_json(db: Session, filepath: str, stream: bool = False, chunk_size: int = CHUNK_SIZE) -> ImportStats:
+    """
+    Import a feed file (JSON object event_id -> payload) into the catalog.
+    The file is first loaded into a shadow catalog (temporary tables), validated
+    there and then merged into the live tables in a single transaction; a failed
+    import leaves the live catalog untouched.
+    With stream=True the file is parsed one entry at a time and every chunk_size
+    events are committed to the shadow tables, so memory does not grow with the file size.
+    The import runs on its own connection from the session's engine.
+    """
+    started_at = datetime.now()
+    started = time.perf_counter()
+    stats = ImportStats()
+
+    file_hash = _file_hash(filepath)
+
+    # temp tables live per connection, so keep one connection for the whole run
+    with db.get_bind().connect() as conn, Session(bind=conn) as session:
+        # same file was already imported -> nothing to do
+        if session.scalar(select(ImportRun.id).where(ImportRun.file_hash == file_hash).limit(1)) is not None:
+            stats.skipped = True
+            stats.duration = time.perf_counter() - started
+            import_runs.inc(labels={"result": "skipped"})
+            logger.info(f"Skip import of {filepath}: file already imported (sha256={file_hash[:12]})")
+            return stats
+        session.rollback()
+
+        try:
+            _shadow.create_all(conn, checkfirst=True)
+            for table in _shadow.sorted_tables:
+                session.execute(delete(table))
+            session.commit()
+
+            # build
+            for chunk in _chunks(_iter_feed(filepath, stream), chunk_size):
+                _stage_chunk(session, chunk)
+                if stream:
+                    session.commit()
+            session.commit()
+
+            # validate
+            stats.events = _validate_shadow(session)
+
+            # swap
+            _swap_in(session, stats)
+            stats.duration = time.perf_counter() - started
+            session.add(ImportRun(
+                file_name=os.path.basename(filepath),
+                file_hash=file_hash,
+                started_at=started_at,
+                duration=stats.duration,
+                events=stats.events,
+                inserted=stats.inserted,
+                updated=stats.updated,
+                unchanged=stats.unchanged,
+                archived=stats.archived,
+                unarchived=stats.unarchived,
+            ))
+            session.commit()
+        except Exception:
+            import_runs.inc(labels={"result": "failed"})
+            raise
+        finally:
+            session.rollback()
+            _shadow.drop_all(conn, checkfirst=True)
+            conn.commit()
+
+        # planner statistics follow the data: the first ones may describe an empty database
+        update_statistics(conn)
+        conn.commit()
+
+    _record_import(stats)
 
-    visited_ids = set()
-
-    for event_id, payload in data.items():
-        visited_ids.add(event_id)
-
-        event = db.query(Event).filter_by(id=event_id).first()
-        if event:
-            event.title = payload.get("title")
-            event.image_url = payload.get("image_url")
-            event.rating = _to_float_or_none(payload.get("rating"))
-            event.price = payload.get("price")
-            event.details = payload.get("details")
-            event.archived = False
-        else:
-            event = Event(
-                id=event_id,
-                title=payload.get("title"),
-                image_url=payload.get("image_url"),
-                rating=_to_float_or_none(payload.get("rating")),
-                price=payload.get("price"),
-                details=payload.get("details"),
-                archived=False
-            )
-            db.add(event)
-            db.flush()
-
-        # update rubrics
-        db.query(EventRubric).filter(EventRubric.event_id == event_id).delete()
-        for code in payload.get("rubrics", []):
-            code = str(code).strip()
-            if not code: continue
-            rubric = db.query(Rubric).filter(Rubric.code == code).first()
-            if not rubric:
-                rubric = Rubric(code=code)
-                db.add(rubric)
-                db.flush()
-            db.add(EventRubric(event_id=event_id, rubric_id=rubric.id))
-
-    # archivate old events
-    if visited_ids:
-        db.query(Event).filter(~Event.id.in_(visited_ids)).update(
-            {"archived": True}, synchronize_session=False
-        )
-    db.commit()
+    logger.info(
+        f"Imported {stats.events} events from {filepath} in {stats.duration:.2f}s "
+        f"(inserted={stats.inserted}, updated={stats.updated}, unchanged={stats.unchanged}, "
+        f"archived={stats.archived}, unarchived={stats.unarchived}, rubrics_created={stats.rubrics_created}, "
+        f"links +{stats.links_added}/-{stats.links_removed})"
+    )
+    return stats
@@ -0,0 +1,89 @@
+import json
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi import Response
+
+from schemas import EventOut
+
+
+MAX_FRAGMENTS = 200_000  # cached events per catalog version
+
+_FLAGS = {
+    (False, False): b',"is_favorite":false,"is_ticket":false}',
+    (True, False): b',"is_favorite":true,"is_ticket":false}',
+    (False, True): b',"is_favorite":false,"is_ticket":true}',
+    (True, True): b',"is_favorite":true,"is_ticket":true}',
+}
+
+
+class FragmentCache:
+    """
+    Serialized EventOut JSON of active events for one catalog version,
+    without the closing brace so the per-user flags can be appended.
+    Callers pass the version of the in-memory catalog snapshot (the
+    database version only before the first one is loaded); versions only
+    grow, so a request still on an older version gets a fresh fragment
+    without flushing the newer ones.
+    """
+
+    def __init__(self, max_size: int = MAX_FRAGMENTS):
+        self.max_size = max_size
+        # (version, fragments): replaced as a whole, so a reader sees a matching pair
+        self._entries: Tuple[Optional[int], Dict[str, bytes]] = (None, {})
+        self._lock = threading.Lock()
+
+    def get(self, version: int, event) -> bytes:
+        """
+        event: any object with EventOut attributes (catalog tuple or ORM row).
+        """
+        cached_version, fragments = self._entries
+        if cached_version == version:
+            fragment = fragments.get(event.id)
+            if fragment is not None:
+                return fragment
+
+        fragment = EventOut(
+            id=event.id,
+            title=event.title,
+            image_url=event.image_url,
+            details=event.details,
+            price=event.price,
+            rating=event.rating,
+            archived=False,
+        ).model_dump_json(exclude={"is_favorite", "is_ticket"}).encode("utf-8")[:-1]
+
+        with self._lock:
+            cached_version, fragments = self._entries
+            if cached_version is not None and version < cached_version:
+                return fragment
+            if cached_version != version or len(fragments) >= self.max_size:
+                fragments = {}
+                self._entries = (version, fragments)
+            fragments[event.id] = fragment
+        return fragment
+
+
+def render_page(
+    rubric: Optional[str],
+    total: Optional[int],
+    offset: int,
+    limit: int,
+    items: Iterable[Tuple[bytes, bool, bool]],
+    next_cursor: Optional[str],
+    headers: Optional[dict] = None,
+) -> Response:
+    """
+    PaginatedEvents response spliced from cached fragments: items are (fragment, is_favorite, is_ticket).
+    """
+    head = json.dumps(
+        {"rubric": rubric or "all", "total": total, "offset": offset, "limit": limit},
+        ensure_ascii=False, separators=(",", ":"),
+    ).encode("utf-8")[:-1]
+    events = b",".join(fragment + _FLAGS[(bool(fav), bool(ticket))] for fragment, fav, ticket in items)
+    tail = json.dumps(next_cursor).encode("utf-8")
+    body = head + b',"events":[' + events + b'],"next_cursor":' + tail + b"}"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+fragments = FragmentCache()
@@ -0,0 +1,43 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from config import settings
+
+
+_T = TypeVar("_T")
+
+
+class ImagePool:
+    """
+    Process pool for CPU-bound Pillow work (avatar uploads, event thumbnails),
+    off the event loop and the request threads. Started on first use.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a process with running threads is not safe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    async def run(self, fn: Callable[..., _T], *args) -> _T:
+        return await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+
+image_pool = ImagePool(settings.IMAGE_WORKERS)
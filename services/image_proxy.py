@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from fastapi import HTTPException, status
+
+from config import settings
+from services.image_pool import image_pool
+from utils.image_utils import save_webp_variants, variant_name
+from utils.logging_utils import RateLimitedLog
+from utils.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+# an unreachable upstream host fails every image of a prefetch
+unavailable_log = RateLimitedLog(logger, interval=60, burst=5)
+
+FAILURE_TTL = 600  # seconds an unavailable image is not requested again
+MAX_FAILURES = 10_000
+USER_AGENT = "afisha-server image proxy"
+
+
+def image_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+
+
+def download(url: str, timeout: float, max_bytes: int) -> bytes:
+    """
+    GET an image from the upstream host (blocking). Raises ValueError on a
+    non-http(s) url or a body larger than max_bytes, OSError on network errors.
+    """
+    if not url.startswith(("http://", "https://")):
+        raise ValueError(f"Unsupported image url {url!r}")
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        data = response.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ValueError(f"Image at {url} is larger than {max_bytes} bytes")
+    return data
+
+
+class ThumbnailCache:
+    """
+    Size-bounded directory of thumbnails with least-recently-used eviction.
+    The index (path -> size, in use order) is rebuilt from file mtimes on
+    first use; hits refresh the mtime so the order survives restarts.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._files: "Optional[OrderedDict[str, int]]" = None
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def path(self, key: str, size: int) -> str:
+        return os.path.join(self.directory, variant_name(key, size))
+
+    def _index(self) -> "OrderedDict[str, int]":
+        if self._files is None:
+            os.makedirs(self.directory, exist_ok=True)
+            entries = []
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith(".webp"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, entry.path, stat.st_size))
+            entries.sort()
+            self._files = OrderedDict((path, size) for _, path, size in entries)
+            self._size = sum(self._files.values())
+        return self._files
+
+    def hit(self, path: str) -> bool:
+        with self._lock:
+            files = self._index()
+            if path in files:
+                files.move_to_end(path)
+            else:
+                # written by another worker
+                try:
+                    files[path] = os.path.getsize(path)
+                except FileNotFoundError:
+                    return False
+                self._size += files[path]
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._size -= files.pop(path, 0)
+            return False
+        return True
+
+    def add(self, written: Dict[str, int]) -> None:
+        with self._lock:
+            files = self._index()
+            for path, size in written.items():
+                self._size += size - files.pop(path, 0)
+                files[path] = size
+            evicted = []
+            while self._size > self.max_bytes and len(files) > len(written):
+                path, size = files.popitem(last=False)
+                self._size -= size
+                evicted.append(path)
+        for path in evicted:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+
+class ImageProxy:
+    """
+    Event images fetched once from the upstream host and served as WebP
+    thumbnails from the disk cache. Downloads are bounded by one semaphore
+    shared by requests and background prefetch; concurrent requests for the
+    same image share one download.
+    """
+
+    def __init__(self, cache: ThumbnailCache, sizes: Sequence[int], concurrency: int, timeout: float, max_bytes: int):
+        self.cache = cache
+        self.sizes = sorted(sizes)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._failures: Dict[str, float] = {}  # key -> retry after (monotonic)
+        self._prefetch: Optional[asyncio.Task] = None
+
+        self.fetches = registry.counter("image_proxy_fetches_total", "Images downloaded from the upstream host")
+        self.fetch_errors = registry.counter("image_proxy_fetch_errors_total", "Failed image downloads")
+        registry.gauge("image_proxy_cache_bytes", "Size of the thumbnail disk cache", lambda: self.cache.size)
+
+    def start(self) -> None:
+        """
+        Bind to the running event loop (needed to schedule prefetch from other threads).
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._inflight = {}
+
+    async def stop(self) -> None:
+        if self._prefetch is not None and not self._prefetch.done():
+            self._prefetch.cancel()
+            try:
+                await self._prefetch
+            except asyncio.CancelledError:
+                pass
+        self._prefetch = None
+
+    def variant(self, size: Optional[int]) -> int:
+        """
+        Smallest thumbnail size not smaller than size (largest if size is not given).
+        """
+        return next((s for s in self.sizes if size is not None and s >= size), self.sizes[-1])
+
+    async def thumbnail(self, url: str, size: int) -> str:
+        """
+        Path of the cached thumbnail, fetching and resizing the image on a miss.
+        Raises 502 if the upstream image is unavailable.
+        """
+        key = image_key(url)
+        path = self.cache.path(key, size)
+        if await asyncio.to_thread(self.cache.hit, path):
+            return path
+        if not await self._fetch(url, key):
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Image is unavailable")
+        return path
+
+    async def _fetch(self, url: str, key: str) -> bool:
+        self.start()
+        retry_after = self._failures.get(key)
+        if retry_after is not None:
+            if retry_after > time.monotonic():
+                return False
+            del self._failures[key]
+
+        # own task: a client going away does not cancel a download others wait for
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._loop.create_task(self._download_and_render(url, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _download_and_render(self, url: str, key: str) -> bool:
+        try:
+            async with self._semaphore:
+                data = await asyncio.to_thread(download, url, self.timeout, self.max_bytes)
+            self.fetches.inc()
+            written = await image_pool.run(save_webp_variants, data, self.cache.directory, key, tuple(self.sizes))
+        except (OSError, ValueError) as e:
+            self.fetch_errors.inc()
+            if len(self._failures) >= MAX_FAILURES:
+                self._failures.clear()
+            self._failures[key] = time.monotonic() + FAILURE_TTL
+            unavailable_log.warning("unavailable", f"Image {url} is unavailable: {e}")
+            return False
+        self.cache.add(written)
+        return True
+
+    def missing(self, urls: Iterable[Optional[str]], limit: int) -> List[str]:
+        """
+        Up to limit distinct urls without a cached thumbnail.
+        """
+        result, seen = [], set()
+        if limit <= 0:
+            return result
+        largest = self.sizes[-1]
+        for url in urls:
+            if not url or url in seen:
+                continue
+            seen.add(url)
+            if not os.path.exists(self.cache.path(image_key(url), largest)):
+                result.append(url)
+                if len(result) >= limit:
+                    break
+        return result
+
+    async def prefetch(self, urls: List[str]) -> None:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(self._fetch(url, image_key(url)) for url in urls), return_exceptions=True)
+        fetched = sum(r is True for r in results)
+        logger.info(f"Prefetched {fetched}/{len(urls)} event images in {time.perf_counter() - started:.1f}s")
+
+    def schedule_prefetch(self, urls: Iterable[Optional[str]], limit: int) -> None:
+        """
+        Fetch thumbnails of urls missing from the cache in the background.
+        Safe to call from any thread once the proxy is started; a prefetch
+        still running is replaced.
+        """
+        if self._loop is None:
+            logger.warning("Image proxy is not started, skip prefetch")
+            return
+        urls = self.missing(urls, limit)
+        if not urls:
+            return
+
+        def run():
+            if self._prefetch is not None and not self._prefetch.done():
+                self._prefetch.cancel()
+            self._prefetch = self._loop.create_task(self.prefetch(urls))
+        self._loop.call_soon_threadsafe(run)
+
+
+image_proxy = ImageProxy(
+    ThumbnailCache(settings.IMAGE_CACHE_DIR, settings.IMAGE_CACHE_BYTES),
+    sizes=settings.IMAGE_SIZES,
+    concurrency=settings.IMAGE_FETCH_CONCURRENCY,
+    timeout=settings.IMAGE_FETCH_TIMEOUT,
+    max_bytes=settings.IMAGE_MAX_BYTES,
+)
@@ -0,0 +1,81 @@
+import logging
+import os
+import time
+from typing import Optional
+
+from config import settings
+from database import SessionLocal, init_db
+from services.catalog import catalog
+from services.events_loader import get_latest_data_file, load_events_from_json
+from services.image_proxy import image_proxy
+from utils.file_lock import FileLock
+from utils.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+
+class ImportScheduler:
+    """
+    Feed imports and catalog refresh under `uvicorn --workers N`.
+    Exactly one worker, the holder of the import lock, imports feeds (at
+    startup and every import_interval seconds). Every worker checks the
+    catalog version every poll interval and reloads its snapshot when the
+    importer published a new one. If the importing worker dies, the OS
+    drops its lock and the next worker to poll takes over.
+    """
+
+    def __init__(self, lock_dir: str, import_interval: float):
+        self.import_interval = import_interval
+        self._migrate_lock = FileLock(os.path.join(lock_dir, "migrate.lock"))
+        self._import_lock = FileLock(os.path.join(lock_dir, "import.lock"))
+        self._next_import: Optional[float] = None
+        registry.gauge("import_leader", "1 if this worker imports the feeds", lambda: int(self.is_leader))
+
+    @property
+    def is_leader(self) -> bool:
+        return self._import_lock.locked
+
+    def startup(self) -> None:
+        # workers start together: one migrates, the others wait and find nothing to do
+        with self._migrate_lock:
+            init_db()
+        if self._import_lock.acquire(blocking=False):
+            logger.info(f"Worker {os.getpid()} imports the feeds")
+            self.import_latest()
+        else:
+            logger.info(f"Worker {os.getpid()} follows the importing worker")
+        self.refresh()
+
+    def tick(self) -> None:
+        """
+        Periodic step (every CATALOG_POLL_SECONDS): take over the imports if
+        their worker is gone, import when due, reload a changed catalog.
+        """
+        if not self.is_leader and self._import_lock.acquire(blocking=False):
+            # the previous importer died, maybe in the middle of its schedule
+            logger.warning(f"Worker {os.getpid()} took over the feed imports")
+            self._next_import = time.monotonic()
+        if self.is_leader and time.monotonic() >= self._next_import:
+            self.import_latest()
+        self.refresh()
+
+    def import_latest(self) -> None:
+        self._next_import = time.monotonic() + self.import_interval
+        latest_file = get_latest_data_file(settings.DATA_DIR)
+        if not latest_file:
+            logger.warning(f"No data files found in {settings.DATA_DIR}")
+            return
+        logger.info(f"Updating DB from {latest_file}")
+        with SessionLocal() as db:
+            load_events_from_json(db, latest_file)
+
+    def refresh(self) -> None:
+        with SessionLocal() as db:
+            reloaded = catalog.reload(db)
+        # thumbnails are shared on disk: only the importer downloads them
+        if reloaded and self.is_leader and catalog.snapshot is not None:
+            image_proxy.schedule_prefetch((e.image_url for e in catalog.snapshot.events), settings.IMAGE_PREFETCH_LIMIT)
+
+
+import_scheduler = ImportScheduler(settings.LOCK_DIR, settings.IMPORT_INTERVAL_SECONDS)
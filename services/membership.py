@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import literal, select, union_all
+from sqlalchemy.orm import Session
+
+from models import Favorite, Ticket
+
+
+MAX_USERS = 10_000  # users kept in cache (LRU)
+MAX_EVENTS_PER_USER = 2_000  # flags kept per user
+
+Flags = Tuple[bool, bool]  # (is_favorite, is_ticket)
+
+
+class MembershipCache:
+    """
+    Per-user favorite/ticket flags of recently shown events.
+    Only the ids of the requested page are resolved. Entries are tied to the
+    user's state version, and the favorite and ticket endpoints invalidate
+    the user's entry after every change.
+    """
+
+    def __init__(self, max_users: int = MAX_USERS, max_events_per_user: int = MAX_EVENTS_PER_USER):
+        self.max_users = max_users
+        self.max_events_per_user = max_events_per_user
+        self._users: "OrderedDict[int, Tuple[int, Dict[str, Flags]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, db: Session, user_id: int, version: int, event_ids: Iterable[str]) -> Dict[str, Flags]:
+        event_ids = list(dict.fromkeys(event_ids))
+        known = {}
+        with self._lock:
+            cached = self._users.get(user_id)
+            if cached is not None and cached[0] == version:
+                self._users.move_to_end(user_id)
+                known = {e: cached[1][e] for e in event_ids if e in cached[1]}
+
+        missing = [e for e in event_ids if e not in known]
+        if missing:
+            resolved = self._query(db, user_id, missing)
+            known.update(resolved)
+            with self._lock:
+                cached = self._users.get(user_id)
+                if cached is None or cached[0] != version:
+                    cached = self._users[user_id] = (version, {})
+                entry = cached[1]
+                self._users.move_to_end(user_id)
+                if len(entry) + len(resolved) > self.max_events_per_user:
+                    entry.clear()
+                entry.update(resolved)
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+
+        return {e: known[e] for e in event_ids}
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    @staticmethod
+    def _query(db: Session, user_id: int, event_ids: list) -> Dict[str, Flags]:
+        # favorites and tickets of the page in one round trip
+        stmt = union_all(
+            select(Favorite.event_id, literal("favorite")).where(Favorite.user_id == user_id, Favorite.event_id.in_(event_ids)),
+            select(Ticket.event_id, literal("ticket")).where(Ticket.user_id == user_id, Ticket.event_id.in_(event_ids)),
+        )
+        favorites, tickets = set(), set()
+        for event_id, kind in db.execute(stmt):
+            (favorites if kind == "favorite" else tickets).add(event_id)
+        return {e: (e in favorites, e in tickets) for e in event_ids}
+
+
+membership = MembershipCache()
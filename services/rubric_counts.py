@@ -0,0 +1,140 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import false, func, select, update
+from sqlalchemy.orm import Session
+
+from models import Event, EventRubric, Favorite, Rubric, Ticket
+from services.catalog import catalog
+from services.user_state import get_user_state_version
+
+
+MAX_USERS = 10_000  # users kept in cache (LRU)
+
+Counts = Tuple[int, int]  # (favorites, tickets)
+
+
+def count_rubric_events(db) -> None:
+    """
+    Store the number of active events of every rubric (run by the importer after the swap).
+    db: session or connection.
+    """
+    events, links, rubrics = Event.__table__, EventRubric.__table__, Rubric.__table__
+    db.execute(update(rubrics).values(active_events=(
+        select(func.count())
+        .select_from(links.join(events, events.c.id == links.c.event_id))
+        .where(links.c.rubric_id == rubrics.c.id, events.c.archived == false())
+        .scalar_subquery()
+    )))
+
+
+def get_rubric_counts(db: Session) -> List[Tuple[str, int]]:
+    """
+    (code, active events) of every rubric.
+    """
+    return [tuple(row) for row in db.execute(select(Rubric.code, Rubric.active_events).order_by(Rubric.code))]
+
+
+@contextmanager
+def _read_snapshot(db: Session):
+    """
+    Statements inside read one snapshot of the database. pysqlite (and
+    aiosqlite) only open transactions for writes, so on SQLite every SELECT
+    would see its own.
+    """
+    conn = db.connection()
+    if conn.dialect.name != "sqlite" or conn.connection.driver_connection.in_transaction:
+        yield
+        return
+    conn.exec_driver_sql("BEGIN")
+    try:
+        yield
+    finally:
+        conn.exec_driver_sql("COMMIT")
+
+
+class RubricCountCache:
+    """
+    Catalog rubric counts for the current catalog version, plus per-user
+    favorite/ticket counts by rubric. A user's counts are built with one
+    grouped query, tied to (catalog version, user state version), and then
+    moved forward by the favorite and ticket endpoints after every change,
+    without querying again.
+    """
+
+    def __init__(self, max_users: int = MAX_USERS):
+        self.max_users = max_users
+        self._catalog: Tuple[Optional[int], List[Tuple[str, int]]] = (None, [])
+        # user id -> (catalog version, user state version, rubric code -> counts)
+        self._users: "OrderedDict[int, Tuple[int, int, Dict[str, Counts]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def catalog_counts(self, db: Session, catalog_version: int) -> List[Tuple[str, int]]:
+        version, counts = self._catalog
+        if version != catalog_version:
+            counts = get_rubric_counts(db)
+            self._catalog = (catalog_version, counts)
+        return counts
+
+    def user_counts(self, db: Session, user_id: int, catalog_version: int, user_version: int) -> Dict[str, Counts]:
+        with self._lock:
+            cached = self._users.get(user_id)
+            if cached is not None and cached[:2] == (catalog_version, user_version):
+                self._users.move_to_end(user_id)
+                return dict(cached[2])
+
+        # version and counts from one snapshot: record() moves the entry forward
+        # from this version, a change counted here must not be applied again
+        with _read_snapshot(db):
+            user_version = get_user_state_version(db, user_id)
+            counts = self._query(db, user_id)
+        with self._lock:
+            self._users[user_id] = (catalog_version, user_version, counts)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return dict(counts)
+
+    def record(self, user_id: int, user_version: int, event_id: str, favorites: int = 0, tickets: int = 0) -> None:
+        """
+        Move the user's counts to user_version after a favorite/ticket change of one event.
+        The entry is dropped if it was not at the previous version (another change happened in between).
+        """
+        snapshot = catalog.snapshot
+        with self._lock:
+            if snapshot is None:
+                self._users.pop(user_id, None)
+                return
+            catalog_version, rubrics = snapshot.version, snapshot.rubrics_of(event_id)
+            cached = self._users.pop(user_id, None)
+            if cached is None or cached[:2] != (catalog_version, user_version - 1):
+                return
+            counts = dict(cached[2])
+            for code in rubrics:
+                fav, ticket = counts.get(code, (0, 0))
+                counts[code] = (fav + favorites, ticket + tickets)
+            self._users[user_id] = (catalog_version, user_version, counts)
+
+    @staticmethod
+    def _query(db: Session, user_id: int) -> Dict[str, Counts]:
+        counts: Dict[str, Counts] = {}
+        for model, slot in ((Favorite, 0), (Ticket, 1)):
+            rows = db.execute(
+                select(Rubric.code, func.count())
+                .select_from(model)
+                .join(Event, Event.id == model.event_id)
+                .join(EventRubric, EventRubric.event_id == Event.id)
+                .join(Rubric, Rubric.id == EventRubric.rubric_id)
+                .where(model.user_id == user_id, Event.archived == False)
+                .group_by(Rubric.code)
+            )
+            for code, count in rows:
+                pair = list(counts.get(code, (0, 0)))
+                pair[slot] = count
+                counts[code] = tuple(pair)
+        return counts
+
+
+rubric_counts = RubricCountCache()
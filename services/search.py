@@ -0,0 +1,103 @@
+import re
+from typing import Optional
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, Text, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from models import Event, EventRubric, Rubric
+
+
+MAX_TERMS = 8  # words of a query used for matching
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+# -----------------------------
+# Full-text index of active events (SQLite FTS5).
+# Not part of models.Base: created by a migration and kept in sync by the importer.
+# -----------------------------
+_fts = MetaData()
+
+events_fts = Table(
+    "events_fts", _fts,
+    Column("rowid", Integer, primary_key=True),
+    Column("event_id", String(24)),
+    Column("title", String),
+    Column("details", Text),
+    Column("events_fts", String),  # hidden column, left side of MATCH
+    Column("rank", String),  # hidden column, bm25 score
+)
+
+_CREATE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5("
+    "event_id UNINDEXED, title, details, tokenize = 'unicode61 remove_diacritics 2')"
+)
+# title matches weigh more than details matches
+_RANK = "bm25(0.0, 10.0, 1.0)"
+
+
+def search_supported(conn) -> bool:
+    return conn.dialect.name == "sqlite"
+
+
+def create_search_index(conn: Connection) -> None:
+    """
+    Create the index and fill it from the active events (migration upgrade).
+    """
+    if not search_supported(conn):
+        return
+    conn.exec_driver_sql(_CREATE)
+    conn.exec_driver_sql(f"INSERT INTO events_fts(events_fts, rank) VALUES ('rank', '{_RANK}')")
+    conn.execute(events_fts.delete())
+    conn.execute(_insert_active())
+
+
+def _insert_active(*where):
+    return events_fts.insert().from_select(
+        ["event_id", "title", "details"],
+        select(Event.id, Event.title, Event.details).where(Event.archived == False, *where),
+    )
+
+
+def sync_search_index(db: Session, reindexed) -> None:
+    """
+    Bring the index in line with the events table after an import: drop the
+    rows of the reindexed events and add those of the active ones again.
+    reindexed: selectable of the ids of changed, archived and un-archived events.
+    An empty index (first import) is filled from the active events in one statement.
+    """
+    if not search_supported(db.get_bind()):
+        return
+    if db.scalar(select(events_fts.c.rowid).limit(1)) is None:
+        db.execute(_insert_active())
+        return
+    # event_id is not indexed: one pass over the index
+    db.execute(events_fts.delete().where(events_fts.c.event_id.in_(reindexed)))
+    db.execute(_insert_active(Event.id.in_(reindexed)))
+
+
+def match_expression(q: str) -> Optional[str]:
+    """
+    FTS5 query for user input: every word must match as a prefix
+    (no stemming, so "концерт" also finds "концерты"). None if the input has no words.
+    """
+    words = _WORD.findall(q)[:MAX_TERMS]
+    if not words:
+        return None
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def search_query(match: str, rubric: Optional[str] = None):
+    """
+    Ids of active events matching the FTS5 expression, best matches first.
+    The index only holds active events, so ranking and counting need no join with events.
+    """
+    query = select(events_fts.c.event_id).where(events_fts.c.events_fts.op("MATCH")(match))
+    if rubric:
+        query = (
+            query.join(EventRubric, EventRubric.event_id == events_fts.c.event_id)
+            .join(Rubric)
+            .where(Rubric.code == rubric)
+        )
+    return query.order_by(events_fts.c.rank)
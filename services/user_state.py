@@ -0,0 +1,23 @@
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from models import UserState
+
+
+def get_user_state_version(db: Session, user_id: int) -> int:
+    return db.scalar(select(UserState.version).where(UserState.user_id == user_id)) or 0
+
+
+def bump_user_state(db: Session, user_id: int) -> int:
+    """
+    Increment the user's state version, call inside the transaction changing favorites/tickets.
+    Returns the new version.
+    """
+    version = db.scalar(
+        update(UserState).where(UserState.user_id == user_id).values(version=UserState.version + 1)
+        .returning(UserState.version)
+    )
+    if version is None:
+        db.add(UserState(user_id=user_id, version=1))
+        version = 1
+    return version
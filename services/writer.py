@@ -0,0 +1,156 @@
+import asyncio
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from utils.metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+_Op = Tuple[Callable, tuple, contextvars.Context]
+_Result = Tuple[bool, object]  # (ok, value or exception)
+
+
+class WriteQueue:
+    """
+    Single writer for user mutations (favorites, tickets).
+    Request handlers queue operations fn(db, *args) and await their own result;
+    one task applies the queued operations in batches on one connection and
+    commits each batch once. A batch is closed max_delay seconds after its
+    first operation or when it holds max_batch operations.
+
+    Operations must raise HTTPException before writing anything: such an
+    error only fails its own request. Any other error rolls the batch back,
+    and its operations are retried one transaction each.
+    """
+
+    def __init__(self, max_batch: int, max_delay: float, queue_limit: int, session_factory=SessionLocal):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue_limit = queue_limit
+        self._session_factory = session_factory
+        # sessions are not thread-safe: all batches run on the same thread
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.batch_size = registry.histogram(
+            "db_write_batch_size", "Operations per writer commit",
+            buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+        )
+        self.commit_time = registry.histogram("db_write_batch_seconds", "Time to apply and commit one writer batch")
+        registry.gauge("db_write_queue_depth", "Operations waiting for the writer", self.queue_depth)
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(self.queue_limit)
+        self._task = loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Apply what is already queued and stop the writer task.
+        """
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, fn: Callable, *args):
+        """
+        Queue fn(db, *args) and return its result once its batch is committed.
+        """
+        self.start()
+        future = self._loop.create_future()
+        # the operation runs in the caller's context (per-request query accounting)
+        await self._queue.put(((fn, args, contextvars.copy_context()), future))
+        return await future
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            # give concurrent requests a moment to join the batch
+            if self._queue.empty():
+                await asyncio.sleep(self.max_delay)
+            batch = [first]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                op = self._queue.get_nowait()
+                if op is None:
+                    stopping = True
+                    break
+                batch.append(op)
+
+            try:
+                results = await self._loop.run_in_executor(
+                    self._executor, self._apply, [op for op, _ in batch]
+                )
+            except Exception as e:
+                logger.exception(f"Writer batch of {len(batch)} operations failed")
+                results = [(False, e)] * len(batch)
+
+            for (_, future), (ok, value) in zip(batch, results):
+                if future.done():  # caller went away
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _apply(self, ops: List[_Op]) -> List[_Result]:
+        started = time.perf_counter()
+        with self._session_factory() as db:
+            try:
+                results = [self._call(db, op) for op in ops]
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Writer batch of {len(ops)} operations rolled back ({e!r}), retrying one by one")
+                results = [self._apply_one(db, op) for op in ops]
+        self.batch_size.observe(len(ops))
+        self.commit_time.observe(time.perf_counter() - started)
+        return results
+
+    @staticmethod
+    def _call(db: Session, op: _Op) -> _Result:
+        fn, args, context = op
+        try:
+            value = context.run(fn, db, *args)
+        except HTTPException as e:
+            return False, e
+        # next operations of the batch see this one's changes
+        context.run(db.flush)
+        return True, value
+
+    def _apply_one(self, db: Session, op: _Op) -> _Result:
+        try:
+            result = self._call(db, op)
+            db.commit()
+            return result
+        except Exception as e:
+            db.rollback()
+            return False, e
+
+
+writer = WriteQueue(
+    max_batch=settings.WRITE_BATCH_SIZE,
+    max_delay=settings.WRITE_BATCH_DELAY_MS / 1000,
+    queue_limit=settings.WRITE_QUEUE_LIMIT,
+)
@@ -0,0 +1,95 @@
+"""
+Settings are read at import time: point them to a temporary directory
+before anything from the app is imported.
+"""
+import os
+import random
+import tempfile
+
+import pytest
+
+
+TMP_DIR = tempfile.mkdtemp(prefix="afisha-tests-")
+os.environ.update({
+    "DATA_DIR": os.path.join(TMP_DIR, "data"),
+    "LOCK_DIR": os.path.join(TMP_DIR, "run"),
+    "DATABASE_URL": f"sqlite:///{os.path.join(TMP_DIR, 'afisha.sqlite3')}",
+    "UPLOAD_DIR": os.path.join(TMP_DIR, "uploads"),
+    "IMAGE_CACHE_DIR": os.path.join(TMP_DIR, "images"),
+    "IMAGE_PREFETCH_LIMIT": "0",
+    "LOG_DIR": os.path.join(TMP_DIR, "logs"),
+    "LOG_LEVEL": "WARNING",
+    "BCRYPT_ROUNDS": "4",
+    "RATE_LIMIT_ENABLED": "false",  # tests turn it on where they need it
+})
+os.makedirs(os.environ["DATA_DIR"], exist_ok=True)
+
+EVENTS = 5000
+USERS = 200
+
+
+@pytest.fixture(scope="session")
+def populated_db():
+    """
+    Catalog of two daily imports with favorites and tickets in between,
+    as in production: the statistics are the ones the importer took.
+    Returns the session factory.
+    """
+    from benchmarks.feed import FeedGenerator, write_feed
+    from database import SessionLocal, init_db
+    from models import Event, Favorite, Ticket, User
+    from services.events_loader import load_events_from_json
+
+    init_db()
+    generator = FeedGenerator(seed=1)
+    feed = generator.feed(EVENTS)
+    path = os.path.join(os.environ["DATA_DIR"], "moscow_events_1.json")
+    write_feed(path, feed)
+    with SessionLocal() as db:
+        load_events_from_json(db, path)
+
+    r = random.Random(1)
+    with SessionLocal() as db:
+        ids = db.scalars(Event.__table__.select().with_only_columns(Event.id).where(Event.archived == False)).all()
+        for user_id in range(1, USERS + 1):
+            db.add(User(id=user_id, username=f"user{user_id}", email=f"user{user_id}@example.com", password_hash="-"))
+            db.add_all(Favorite(user_id=user_id, event_id=event_id) for event_id in r.sample(ids, 20))
+            db.add_all(Ticket(user_id=user_id, event_id=event_id) for event_id in r.sample(ids, 10))
+        db.commit()
+
+    path = os.path.join(os.environ["DATA_DIR"], "moscow_events_2.json")
+    write_feed(path, generator.next_day(feed))
+    with SessionLocal() as db:
+        load_events_from_json(db, path)
+    return SessionLocal
+
+
+@pytest.fixture(scope="session")
+def client(populated_db):
+    """
+    The app on the populated database, lifespan included.
+    """
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def register(client):
+    """
+    register(username, avatar=None) -> (auth headers, user payload); avatar: (name, bytes, content type).
+    """
+    def register(username: str, avatar=None):
+        response = client.post(
+            "/api/auth/register",
+            data={"username": username, "email": f"{username}@example.com", "password": f"{username}-password-1"},
+            files={"avatar": avatar} if avatar else None,
+        )
+        assert response.status_code == 200, response.text
+        body = response.json()
+        return {"Authorization": f"Bearer {body['access_token']}"}, body["user"]
+
+    return register
@@ -0,0 +1,85 @@
+import asyncio
+import io
+import os
+import random
+
+from PIL import Image
+
+import routers.auth
+from config import settings
+
+
+def _png(seed: int, size=(64, 64)) -> bytes:
+    r = random.Random(seed)
+    image = Image.new("RGB", size)
+    image.putdata([(r.randrange(256), r.randrange(256), r.randrange(256)) for _ in range(size[0] * size[1])])
+    data = io.BytesIO()
+    image.save(data, "PNG")
+    return data.getvalue()
+
+
+def test_concurrent_registration_of_the_same_name(client, register, monkeypatch):
+    register("taken", ("avatar.png", _png(0), "image/png"))
+    find_conflict = routers.auth._find_conflict
+    calls = []
+
+    async def missed_conflict(db, username, email):
+        # the other registration commits between the check and the insert
+        calls.append(username)
+        return None if len(calls) == 1 else await find_conflict(db, username, email)
+
+    monkeypatch.setattr(routers.auth, "_find_conflict", missed_conflict)
+    files_before = set(os.listdir(settings.UPLOAD_DIR))
+    response = client.post(
+        "/api/auth/register",
+        data={"username": "taken", "email": "other@example.com", "password": "other-password-1"},
+        files={"avatar": ("avatar.png", _png(1), "image/png")},
+    )
+    assert response.status_code == 409, response.text
+    assert response.json()["detail"] == "Username already exists"
+    # the variants of the rejected avatar are gone, those of other users stay
+    assert set(os.listdir(settings.UPLOAD_DIR)) == files_before
+
+
+def _post_avatar(chunks: int, content_length: bool):
+    """
+    Stream a multipart registration with an avatar of chunks MB straight
+    into the app; returns (status code, body messages the app received).
+    """
+    import main
+
+    boundary = b"limit"
+    head = b"--" + boundary + b'\r\nContent-Disposition: form-data; name="avatar"; filename="a.png"\r\n\r\n'
+    chunk = b"\0" * (1024 * 1024)
+    received = 0
+
+    async def receive():
+        nonlocal received
+        received += 1
+        return {"type": "http.request", "body": head if received == 1 else chunk, "more_body": received <= chunks}
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    headers = [(b"content-type", b"multipart/form-data; boundary=" + boundary)]
+    if content_length:
+        headers.append((b"content-length", str(len(head) + chunks * len(chunk)).encode()))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/api/auth/register", "raw_path": b"/api/auth/register", "root_path": "", "query_string": b"",
+        "headers": headers, "client": ("127.0.0.1", 50000), "server": ("testserver", 80),
+    }
+    asyncio.run(main.app(scope, receive, send))
+    return messages[0]["status"], received
+
+
+def test_avatar_over_the_limit_by_content_length(client):
+    assert _post_avatar(50, content_length=True) == (413, 0)
+
+
+def test_streamed_body_is_cut_off_at_the_limit(client):
+    status, received = _post_avatar(50, content_length=False)  # chunked
+    assert status == 413
+    assert received <= settings.AVATAR_MAX_BYTES // (1024 * 1024) + 2
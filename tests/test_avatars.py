@@ -0,0 +1,30 @@
+import io
+
+from PIL import Image
+
+from config import settings
+
+
+def test_user_payload_links_immutable_variants(client, register):
+    image = io.BytesIO()
+    Image.new("RGB", (600, 400), "blue").save(image, "PNG")
+    _, user = register("avatars", ("avatar.png", image.getvalue(), "image/png"))
+
+    variants = {int(size): url for size, url in user["avatar_variants"].items()}
+    assert sorted(variants) == sorted(settings.AVATAR_SIZES)
+    assert user["avatar_url"] == variants[max(variants)]
+    for size, url in variants.items():
+        assert url.startswith("/api/avatars/files/") and url.endswith(f"_{size}.webp")
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert max(Image.open(io.BytesIO(response.content)).size) <= size
+        assert client.get(url, headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+    login = client.post("/api/auth/login", data={"login": "avatars", "password": "avatars-password-1"})
+    assert login.json()["user"]["avatar_variants"] == user["avatar_variants"]
+
+
+def test_user_without_avatar(register):
+    _, user = register("noavatar")
+    assert user["avatar_url"] is None and user["avatar_variants"] == {}
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from benchmarks.feed import FeedGenerator
+from migrations import migrate
+from models import Base
+from services.events_loader import load_events_from_json
+
+
+def _days():
+    """
+    Three daily feeds: changed, removed (archived) and added events on day 2,
+    events returning from the archive and changed rubrics on day 3.
+    """
+    generator = FeedGenerator(seed=3)
+    day1 = generator.feed(60)
+    day2 = generator.next_day(day1, changed=0.2, removed=0.2, added=0.2)
+    day3 = generator.next_day(dict(day1, **day2), changed=0.1, removed=0.1, added=0.1)
+    for event_id in list(day3)[:5]:
+        day3[event_id] = dict(day3[event_id], rubrics=["concert", "art", "kids"])
+    return [day1, day2, day3]
+
+
+def _write(path, feed: dict) -> str:
+    items = [f"{json.dumps(event_id)}: {json.dumps(payload, ensure_ascii=False)}" for event_id, payload in feed.items()]
+    # an id repeated later in the file (in another chunk): its last payload wins
+    first = next(iter(feed))
+    items.insert(0, f"{json.dumps(first)}: {json.dumps(dict(feed[first], title='stale', rubrics=['stale']))}")
+    path.write_text("{" + ",\n".join(items) + "}", encoding="utf-8")
+    return str(path)
+
+
+def _state(engine) -> dict:
+    queries = {
+        "events": "SELECT id, title, image_url, rating, price, details, archived FROM events",
+        "event_rubrics": "SELECT event_id, code FROM event_rubrics JOIN rubrics ON rubrics.id = rubric_id",
+        "rubrics": "SELECT code, active_events FROM rubrics",
+        "event_hashes": "SELECT event_id, content_hash FROM event_hashes",
+        "events_fts": "SELECT event_id, title, details FROM events_fts",
+    }
+    with engine.connect() as conn:
+        return {name: sorted(conn.execute(text(sql)).all()) for name, sql in queries.items()}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7])
+def test_streaming_import_matches_whole_file_import(tmp_path, chunk_size):
+    states = []
+    for stream in (False, True):
+        engine = create_engine(f"sqlite:///{tmp_path / f'stream_{stream}.sqlite3'}")
+        Base.metadata.create_all(engine)
+        migrate(engine)
+        for day, feed in enumerate(_days(), 1):
+            path = _write(tmp_path / f"moscow_events_{stream}_{day}.json", feed)
+            with Session(engine) as db:
+                load_events_from_json(db, path, stream=stream, chunk_size=chunk_size)
+        states.append(_state(engine))
+        engine.dispose()
+
+    whole, streamed = states
+    assert whole == streamed
+    events = whole["events"]
+    assert any(archived for *_, archived in events) and not any(title == "stale" for _, title, *_ in events)
+    assert len(whole["events_fts"]) == sum(not archived for *_, archived in events)
+
+
+def test_long_rubric_code_only_drops_that_rubric(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'afisha.sqlite3'}")
+    Base.metadata.create_all(engine)
+    migrate(engine)
+    feed = FeedGenerator(seed=4).feed(10)
+    event_id = next(iter(feed))
+    feed[event_id] = dict(feed[event_id], rubrics=["concert", "x" * 33])
+    path = tmp_path / "moscow_events_1.json"
+    path.write_text(json.dumps(feed, ensure_ascii=False), encoding="utf-8")
+
+    with Session(engine) as db:
+        stats = load_events_from_json(db, str(path))
+    state = _state(engine)
+    engine.dispose()
+    assert stats.events == len(state["events"]) == 10
+    assert [code for e, code in state["event_rubrics"] if e == event_id] == ["concert"]
+    assert all(len(code) <= 32 for code, _ in state["rubrics"])
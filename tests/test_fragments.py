@@ -0,0 +1,30 @@
+import json
+
+from services.catalog import CatalogEvent
+from services.fragments import FragmentCache, render_page
+
+
+def _event(event_id: str, title: str) -> CatalogEvent:
+    return CatalogEvent(event_id, title, None, 4.5, "500 ₽", "details")
+
+
+def test_older_version_does_not_flush_newer_fragments():
+    cache = FragmentCache()
+    new = cache.get(2, _event("a", "new title"))
+    # a request that started before the reload renders with the old version
+    assert b"old title" in cache.get(1, _event("a", "old title"))
+    assert cache.get(2, _event("a", "ignored")) is new
+    # a newer version replaces the cached one
+    assert b"newest" in cache.get(3, _event("a", "newest"))
+    assert b"newest" not in cache.get(2, _event("a", "new title"))
+
+
+def test_page_from_fragments():
+    cache = FragmentCache()
+    page = render_page("concert", 1, 0, 12, [(cache.get(1, _event("a", "title")), True, False)], None)
+    body = json.loads(page.body)
+    assert body["events"][0] == {
+        "id": "a", "title": "title", "image_url": None, "details": "details", "price": "500 ₽",
+        "rating": 4.5, "archived": False, "is_favorite": True, "is_ticket": False,
+    }
+    assert body["rubric"] == "concert" and body["next_cursor"] is None
@@ -0,0 +1,121 @@
+"""
+The image proxy against a stand-in upstream host (http.server on a free port).
+"""
+import io
+import os
+import socket
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from PIL import Image
+
+from config import settings
+from models import Event
+from services.image_proxy import ThumbnailCache, image_key, image_proxy
+
+
+def _jpeg(color: str) -> bytes:
+    data = io.BytesIO()
+    Image.new("RGB", (800, 600), color).save(data, "JPEG")
+    return data.getvalue()
+
+
+IMAGES = {f"/{color}.jpg": _jpeg(color) for color in ("red", "green", "blue", "gray")}
+
+
+@pytest.fixture(scope="module")
+def upstream():
+    requests = Counter()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests[self.path] += 1
+            body, content_type = IMAGES.get(self.path, b"not an image"), "image/jpeg"
+            if self.path not in IMAGES:
+                content_type = "text/plain"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", requests
+    server.shutdown()
+    server.server_close()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def events(populated_db, upstream):
+    """
+    event id -> image url; archived events, so the proxy looks them up in the database.
+    """
+    base, _ = upstream
+    urls = {f"image{i:019d}": f"{base}{path}" for i, path in enumerate([*IMAGES, "/text"])}
+    urls["image-down"] = f"http://127.0.0.1:{_free_port()}/red.jpg"  # nothing listens there
+    with populated_db() as db:
+        db.add_all(Event(id=event_id, title="image", image_url=url, archived=True) for event_id, url in urls.items())
+        db.commit()
+    return urls
+
+
+def test_thumbnails_are_fetched_once(client, upstream, events):
+    _, requests = upstream
+    event_id = next(e for e, url in events.items() if url.endswith("/red.jpg") and e != "image-down")
+    etags = {}
+    for size in settings.IMAGE_SIZES:
+        response = client.get(f"/api/images/{event_id}?size={size}")
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/webp"
+        image = Image.open(io.BytesIO(response.content))
+        assert image.format == "WEBP" and max(image.size) == size
+        etags[size] = response.headers["etag"]
+    # every size was rendered from the first download, later requests are cache hits
+    assert client.get(f"/api/images/{event_id}").status_code == 200
+    assert requests["/red.jpg"] == 1
+
+    size = settings.IMAGE_SIZES[0]
+    response = client.get(f"/api/images/{event_id}?size={size}", headers={"If-None-Match": etags[size]})
+    assert response.status_code == 304 and not response.content
+
+
+@pytest.mark.parametrize("event_id", ["image-down", f"image{len(IMAGES):019d}"])  # upstream down, not an image
+def test_unavailable_upstream_image(client, events, event_id):
+    assert client.get(f"/api/images/{event_id}").status_code == 502
+
+
+def test_least_recently_used_thumbnails_are_evicted(client, upstream, events, tmp_path, monkeypatch):
+    _, requests = upstream
+    ids = {url: event_id for event_id, url in events.items()}
+    first, *others = (url for url in events.values() if url.endswith(("/green.jpg", "/blue.jpg", "/gray.jpg")))
+    cache = ThumbnailCache(str(tmp_path), max_bytes=1)  # the thumbnails just written stay
+    monkeypatch.setattr(image_proxy, "cache", cache)
+
+    assert client.get(f"/api/images/{ids[first]}").status_code == 200
+    # room for about two images
+    cache.max_bytes = cache.size * 5 // 2
+    for url in others:
+        assert client.get(f"/api/images/{ids[url]}").status_code == 200
+    assert cache.size <= cache.max_bytes
+
+    # least recently used first: the largest thumbnail of the first image is gone from disk
+    largest = max(settings.IMAGE_SIZES)
+    assert not os.path.exists(cache.path(image_key(first), largest))
+    assert all(os.path.exists(cache.path(image_key(url), size)) for url in others for size in settings.IMAGE_SIZES)
+    path = "/" + first.rsplit("/", 1)[1]
+    fetched = requests[path]
+    assert client.get(f"/api/images/{ids[first]}?size={largest}").status_code == 200
+    assert requests[path] == fetched + 1
@@ -0,0 +1,45 @@
+import io
+import warnings
+
+import pytest
+from PIL import Image
+
+from utils.image_utils import MAX_PIXELS, save_webp_variants
+
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    data = io.BytesIO()
+    image.save(data, fmt)
+    return data.getvalue()
+
+
+def test_variants(tmp_path):
+    written = save_webp_variants(_encode(Image.new("RGB", (300, 200), "red"), "JPEG"), str(tmp_path), "k", [64, 128])
+    sizes = {path.rsplit("_", 1)[1]: Image.open(path).size for path in written}
+    assert sizes == {"64.webp": (64, 43), "128.webp": (128, 85)}
+
+
+@pytest.mark.parametrize("bomb_warnings", ["default", "error"])
+def test_more_pixels_than_the_limit(tmp_path, bomb_warnings):
+    # between MAX_PIXELS and twice that Pillow only warns
+    width = 8000
+    data = _encode(Image.new("1", (width, MAX_PIXELS // width + 1)), "PNG")
+    with warnings.catch_warnings(), pytest.raises(ValueError, match="Invalid image"):
+        warnings.simplefilter(bomb_warnings, Image.DecompressionBombWarning)
+        save_webp_variants(data, str(tmp_path), "k", [64])
+
+
+_PNG = _encode(Image.new("RGB", (4, 4)), "PNG")
+
+
+@pytest.mark.parametrize("data", [
+    _encode(Image.new("RGB", (64, 64), "red"), "JPEG")[:200],  # truncated
+    _encode(Image.new("RGB", (64, 64), "red"), "PNG")[:60],
+    b"GIF89a" + b"\xff" * 20,
+    b"P6\n4o 4\n255\n" + b"\0" * 48,  # ValueError from the header parser
+    _PNG[:8] + b"\0\0\0\x05" + _PNG[12:],  # IHDR chunk shorter than its fields
+    b"not an image",
+])
+def test_broken_files(tmp_path, data):
+    with pytest.raises(ValueError, match="Invalid image"):
+        save_webp_variants(data, str(tmp_path), "k", [64])
@@ -0,0 +1,50 @@
+import pytest
+from fastapi import HTTPException
+
+from utils.pagination import INT_MAX, INT_MIN, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(42), int) == 42
+    assert decode_cursor(encode_cursor("65a1"), str) == "65a1"
+    assert decode_cursor(encode_cursor(INT_MIN), int) == INT_MIN
+    assert decode_cursor(None, int) is None
+
+
+@pytest.mark.parametrize("key, key_type, minimum", [
+    (INT_MAX + 1, int, INT_MIN),
+    (10 ** 30, int, INT_MIN),
+    (INT_MIN - 1, int, INT_MIN),
+    (-5, int, 0),
+    (True, int, INT_MIN),
+    (1, str, INT_MIN),
+])
+def test_invalid_cursor_keys(key, key_type, minimum):
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(encode_cursor(key), key_type, minimum)
+    assert e.value.status_code == 400
+
+
+@pytest.fixture(scope="module")
+def auth(register):
+    headers, _ = register("cursor")
+    return headers
+
+
+@pytest.mark.parametrize("path", ["/api/favorites/", "/api/tickets/", "/api/events/search?q=concert"])
+@pytest.mark.parametrize("key", [2 ** 63, 10 ** 30])
+def test_out_of_range_cursor_is_rejected(client, auth, path, key):
+    separator = "&" if "?" in path else "?"
+    response = client.get(f"{path}{separator}cursor={encode_cursor(key)}", headers=auth)
+    assert response.status_code == 400 and response.json()["detail"] == "Invalid cursor"
+
+
+def test_negative_search_offset_is_rejected(client):
+    response = client.get(f"/api/events/search?q=concert&cursor={encode_cursor(-5)}")
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("path", ["/api/favorites/", "/api/tickets/", "/api/events/", "/api/events/search?q=concert"])
+def test_out_of_range_offset_is_rejected(client, auth, path):
+    separator = "&" if "?" in path else "?"
+    assert client.get(f"{path}{separator}offset={2 ** 63}", headers=auth).status_code == 422
@@ -0,0 +1,82 @@
+"""
+Statements per request of every route, authenticated and with cold caches
+(as in a fresh worker), against QUERY_BUDGETS.
+"""
+import io
+
+import pytest
+from PIL import Image
+
+from services.catalog import catalog
+from services.membership import membership
+from services.rubric_counts import rubric_counts
+from utils.db_stats import assert_query_budgets
+from utils.security import token_cache
+
+
+@pytest.fixture(scope="module")
+def auth(register):
+    image = io.BytesIO()
+    Image.new("RGB", (64, 64)).save(image, "PNG")
+    headers, user = register("budget", ("avatar.png", image.getvalue(), "image/png"))
+    return headers, user["id"]
+
+
+def _cold_caches():
+    for user_id in list(token_cache._by_user):
+        token_cache.invalidate_user(user_id)
+    membership._users.clear()
+    rubric_counts._users.clear()
+    rubric_counts._catalog = (None, [])
+
+
+def _event_ids(n: int):
+    return [e.id for e in catalog.snapshot.events[:n]]
+
+
+REQUESTS = [
+    ("GET", "/api/events/?limit=12", 200),
+    ("GET", "/api/events/?limit=12&rubric=concert", 200),
+    ("GET", "/api/events/?id={events}", 200),
+    ("GET", "/api/events/search?q={word}", 200),
+    ("GET", "/api/events/search?q={word}&rubric=concert", 200),
+    ("GET", "/api/rubrics/", 200),
+    ("POST", "/api/favorites/{event}", 200),
+    ("GET", "/api/favorites/", 200),
+    ("GET", "/api/favorites/?rubric=concert&with_total=true", 200),
+    ("DELETE", "/api/favorites/{event}", 200),
+    ("POST", "/api/tickets/{event}", 200),
+    ("GET", "/api/tickets/", 200),
+    ("GET", "/api/tickets/?rubric=concert&with_total=true", 200),
+    ("GET", "/api/avatars/{user}", 200),
+    ("GET", "/api/images/unknown", 404),  # not in the catalog: looked up in the database
+]
+
+
+@pytest.mark.parametrize("method, path, status", REQUESTS)
+def test_route_within_budget(client, auth, method, path, status):
+    headers, user_id = auth
+    ids = _event_ids(3)
+    word = catalog.snapshot.events[0].title.split()[0]
+    path = path.format(event=ids[0], events=",".join(ids), user=user_id, word=word)
+    _cold_caches()
+    with assert_query_budgets():
+        response = client.request(method, path, headers=headers)
+    assert response.status_code == status, response.text
+
+
+def test_ticket_replacing_favorite_within_budget(client, auth):
+    headers, _ = auth
+    event_id = _event_ids(5)[4]
+    assert client.post(f"/api/favorites/{event_id}", headers=headers).status_code == 200
+    _cold_caches()
+    with assert_query_budgets():
+        assert client.post(f"/api/tickets/{event_id}", headers=headers).status_code == 200
+
+
+def test_auth_within_budget(client):
+    data = {"username": "budget2", "email": "budget2@example.com", "password": "budget-password-1"}
+    with assert_query_budgets():
+        assert client.post("/api/auth/register", data=data).status_code == 200
+    with assert_query_budgets():
+        assert client.post("/api/auth/login", data={"login": "budget2", "password": data["password"]}).status_code == 200
@@ -0,0 +1,35 @@
+import pytest
+
+from utils.query_plan import driving_index, hot_queries, plan_problems, query_plan
+
+
+@pytest.mark.parametrize("name", list(hot_queries()))
+def test_hot_query_plan(populated_db, name):
+    with populated_db() as db:
+        plan = query_plan(db, hot_queries()[name])
+    assert plan_problems(name, plan) == [], "\n".join(plan)
+
+
+@pytest.mark.parametrize("name, index", [
+    ("favorites.page", "ix_favorites_user_id"),
+    ("favorites.page[rubric=concert]", "ix_favorites_user_id"),
+    ("tickets.page", "ix_tickets_user_id"),
+    ("tickets.page[rubric=concert]", "ix_tickets_user_id"),
+    ("events.page", "ix_events_archived_id"),
+    ("events.page[rubric=concert]", "ix_events_archived_id"),
+])
+def test_pages_start_from_their_index(populated_db, name, index):
+    with populated_db() as db:
+        assert driving_index(query_plan(db, hot_queries()[name])) == index
+
+
+def test_checker_rejects_plans_of_stale_statistics():
+    # favorites.page as planned with statistics of an empty database
+    plan = [
+        "SEARCH events USING INDEX ix_events_archived_id (archived=?)",
+        "SEARCH favorites USING COVERING INDEX sqlite_autoindex_favorites_1 (user_id=? AND event_id=?)",
+        "USE TEMP B-TREE FOR ORDER BY",
+    ]
+    problems = plan_problems("favorites.page", plan)
+    assert any("TEMP B-TREE" in p for p in problems)
+    assert any("driven by ix_events_archived_id" in p for p in problems)
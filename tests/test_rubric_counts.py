@@ -0,0 +1,39 @@
+from sqlalchemy import select
+
+from models import Favorite
+from services.catalog import catalog
+from services.rubric_counts import RubricCountCache
+from services.user_state import bump_user_state, get_user_state_version
+
+
+def test_change_while_counting_is_counted_once(populated_db):
+    user_id = 7
+    with populated_db() as db:
+        catalog.reload(db)
+        favorites = set(db.scalars(select(Favorite.event_id).where(Favorite.user_id == user_id)))
+        old_version = get_user_state_version(db, user_id)
+    snapshot = catalog.snapshot
+    event_id = next(e.id for e in snapshot.events if e.id not in favorites and snapshot.rubrics_of(e.id))
+
+    cache = RubricCountCache()
+    query = cache._query
+    new_version = None
+
+    def favorite_meanwhile(db, uid):
+        # the writer commits a favorite between the version read and the grouped counts
+        nonlocal new_version
+        with populated_db() as other:
+            other.add(Favorite(user_id=user_id, event_id=event_id))
+            new_version = bump_user_state(other, user_id)
+            other.commit()
+        return query(db, uid)
+
+    cache._query = favorite_meanwhile
+    with populated_db() as db:
+        cache.user_counts(db, user_id, snapshot.version, old_version)
+    cache._query = query
+    # what the favorites endpoint does after its change
+    cache.record(user_id, new_version, event_id, favorites=1)
+
+    with populated_db() as db:
+        assert cache.user_counts(db, user_id, snapshot.version, new_version) == query(db, user_id)
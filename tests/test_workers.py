@@ -0,0 +1,138 @@
+"""
+`uvicorn main:app --workers N` against one database: exactly one worker
+imports a feed, every worker serves the catalog of the next import, and
+another worker takes the imports over when the importing one is killed.
+"""
+import json
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+from benchmarks.feed import FeedGenerator, write_feed
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKERS = 3
+EVENTS = 2000
+IMPORT_INTERVAL = 3
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _totals(port: int) -> set:
+    """
+    Catalog sizes reported by the workers answering requests.
+    """
+    totals = set()
+    for _ in range(WORKERS * 4):
+        # new connection per request, so the kernel spreads them over the workers
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/events/?limit=1", timeout=10) as response:
+            totals.add(json.load(response)["total"])
+    return totals
+
+
+def _wait_for_total(port: int, total: int, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if _totals(port) == {total}:
+                return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def _import_runs(db_path: str) -> int:
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute("SELECT count(*) FROM import_runs").fetchone()[0]
+
+
+def _leader(lock_dir: str) -> int:
+    with open(os.path.join(lock_dir, "import.lock")) as f:
+        return int(f.read().strip())
+
+
+@pytest.fixture
+def server(tmp_path):
+    data_dir, lock_dir = tmp_path / "data", tmp_path / "run"
+    data_dir.mkdir()
+    generator = FeedGenerator(seed=2)
+    feed = generator.feed(EVENTS)
+    write_feed(str(data_dir / "moscow_events_1.json"), feed)
+
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DATA_DIR=str(data_dir),
+        LOCK_DIR=str(lock_dir),
+        DATABASE_URL=f"sqlite:///{tmp_path / 'afisha.sqlite3'}",
+        UPLOAD_DIR=str(tmp_path / "uploads"),
+        IMAGE_CACHE_DIR=str(tmp_path / "images"),
+        IMAGE_PREFETCH_LIMIT="0",
+        LOG_DIR=str(tmp_path / "logs"),
+        LOG_LEVEL="INFO",
+        RATE_LIMIT_ENABLED="false",
+        IMPORT_INTERVAL_SECONDS=str(IMPORT_INTERVAL),
+        CATALOG_POLL_SECONDS="1",
+    )
+    log_path = tmp_path / "server.log"
+    with open(log_path, "wb") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(WORKERS)],
+            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    try:
+        yield {
+            "port": port, "feed": feed, "generator": generator, "data_dir": str(data_dir),
+            "lock_dir": str(lock_dir), "db_path": str(tmp_path / "afisha.sqlite3"), "log": log_path,
+        }
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def test_one_importer_and_failover(server):
+    port, generator, feed = server["port"], server["generator"], server["feed"]
+
+    def log_tail():
+        return server["log"].read_text(errors="replace")[-5000:]
+
+    # startup: one import, every worker serves it
+    assert _wait_for_total(port, len(feed), timeout=120), log_tail()
+    assert _import_runs(server["db_path"]) == 1, log_tail()
+    log = server["log"].read_text(errors="replace")
+    assert log.count("imports the feeds") == 1, log_tail()
+    assert log.count("follows the importing worker") == WORKERS - 1, log_tail()
+
+    # next feed: imported once more, picked up by every worker
+    feed = generator.next_day(feed)
+    write_feed(os.path.join(server["data_dir"], "moscow_events_2.json"), feed)
+    assert _wait_for_total(port, len(feed), timeout=IMPORT_INTERVAL + 30), log_tail()
+    assert _import_runs(server["db_path"]) == 2, log_tail()
+
+    # importing worker killed: another one takes over
+    leader = _leader(server["lock_dir"])
+    os.kill(leader, signal.SIGKILL)
+    feed = generator.next_day(feed)
+    write_feed(os.path.join(server["data_dir"], "moscow_events_3.json"), feed)
+    assert _wait_for_total(port, len(feed), timeout=IMPORT_INTERVAL + 60), log_tail()
+    assert _leader(server["lock_dir"]) != leader, log_tail()
+    assert _import_runs(server["db_path"]) == 3, log_tail()
+    log = server["log"].read_text(errors="replace")
+    assert log.count("took over the feed imports") == 1, log_tail()
+    assert "Skip import" not in log, log_tail()  # nobody imported a feed twice
@@ -0,0 +1,174 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from ipaddress import IPv4Network, IPv6Network, ip_address, ip_network
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+Network = Union[IPv4Network, IPv6Network]
+
+
+def parse_networks(values: Iterable[str]) -> List[Network]:
+    return [ip_network(value, strict=False) for value in values]
+
+
+def _in_networks(address: str, networks: Sequence[Network]) -> bool:
+    try:
+        ip = ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def _forwarded_for(raw_headers: Iterable[Tuple[bytes, bytes]]) -> List[str]:
+    """
+    Addresses of the Forwarded (RFC 7239) or X-Forwarded-For header, client first.
+    """
+    headers: Dict[bytes, bytes] = {}
+    for name, value in raw_headers:
+        if name in (b"forwarded", b"x-forwarded-for"):
+            # repeated headers are one comma separated list
+            headers[name] = headers[name] + b"," + value if name in headers else value
+    forwarded = headers.get(b"forwarded")
+    if forwarded is not None:
+        hops = []
+        for element in forwarded.decode("latin-1").split(","):
+            for pair in element.split(";"):
+                name, _, value = pair.strip().partition("=")
+                if name.lower() == "for":
+                    value = value.strip('"')
+                    if value.startswith("["):  # "[2001:db8::1]:4711"
+                        value = value[1:value.find("]")]
+                    elif value.count(":") == 1:  # "192.0.2.1:4711"
+                        value = value.split(":")[0]
+                    hops.append(value)
+        return hops
+    forwarded = headers.get(b"x-forwarded-for")
+    if forwarded is not None:
+        return [hop.strip() for hop in forwarded.decode("latin-1").split(",") if hop.strip()]
+    return []
+
+
+def client_address(scope, trusted_proxies: Sequence[Network]) -> str:
+    """
+    Address of the client. Behind trusted proxies it comes from their
+    forwarding headers: the nearest hop not belonging to a trusted proxy,
+    so a client can not choose its address by sending the header itself.
+    """
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    if not trusted_proxies or not _in_networks(address, trusted_proxies):
+        return address
+    for hop in reversed(_forwarded_for(scope["headers"])):
+        address = hop
+        if not _in_networks(hop, trusted_proxies):
+            break
+    return address
+
+
+class TokenBucketLimiter:
+    """
+    In-memory token buckets, one per key (user id or client ip): rate tokens
+    per second up to burst. Least recently seen keys are dropped above
+    max_keys, which only forgives their past requests.
+    Used from the event loop only.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # key -> (tokens, updated)
+
+    def acquire(self, key: str) -> float:
+        """
+        Take a token: 0.0 if allowed, else seconds until the next token.
+        """
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class ConcurrencyGate:
+    """
+    At most limit requests in progress; up to queue_limit more wait for a
+    slot (at most timeout seconds, first come first served). Anything beyond
+    is rejected at once, so a spike costs a fast 503 instead of a slow
+    request for everybody. Not bound to an event loop.
+    """
+
+    def __init__(self, limit: int, queue_limit: int, timeout: float):
+        self.limit = limit
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> Optional[str]:
+        """
+        None once a slot is taken, else the rejection reason.
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return None
+        if len(self._waiters) >= self.queue_limit:
+            return "queue_full"
+
+        slot = asyncio.get_running_loop().create_future()
+        self._waiters.append(slot)
+        try:
+            await asyncio.wait_for(asyncio.shield(slot), self.timeout)
+        except asyncio.TimeoutError:
+            if slot.done():  # handed over at the last moment
+                return None
+            self._waiters.remove(slot)
+            return "queue_timeout"
+        except asyncio.CancelledError:
+            if slot.done():
+                self.release()
+            else:
+                self._waiters.remove(slot)
+            raise
+        return None
+
+    def release(self) -> None:
+        if self._waiters:
+            # the slot passes to the longest waiting request
+            self._waiters.popleft().set_result(None)
+        else:
+            self.active -= 1
+
+
+class RouteGates:
+    """
+    One ConcurrencyGate per route key ("METHOD /route"), created on first use.
+    """
+
+    def __init__(self, default_limit: int, limits: Dict[str, int], queue_limit: int, timeout: float):
+        self.default_limit = default_limit
+        self.limits = limits
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+        self._gates: Dict[str, ConcurrencyGate] = {}
+
+    def get(self, key: str) -> ConcurrencyGate:
+        gate = self._gates.get(key)
+        if gate is None:
+            limit = self.limits.get(key, self.default_limit)
+            gate = self._gates[key] = ConcurrencyGate(limit, self.queue_limit, self.timeout)
+        return gate
+
+    def waiting(self) -> int:
+        return sum(gate.waiting for gate in self._gates.values())
@@ -0,0 +1,209 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import settings
+from utils.logging_utils import RateLimitedLog
+from utils.metrics import registry
+
+
+# Per-request database accounting: engine events add every statement to the
+# QueryStats of the current context (set by the metrics middleware). The async
+# engine runs its statements in greenlets sharing the caller's context, and
+# run_in_threadpool copies it, so both paths are attributed to the request.
+# Slow statements are logged with their route, and a statement repeated
+# QUERY_REPEAT_LIMIT times in one request is reported as a likely N+1 loop.
+
+logger = logging.getLogger(__name__)
+slow_log = RateLimitedLog(logger, interval=60, burst=10)
+
+_current: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+
+db_queries = registry.counter("db_queries_total", "Database statements executed (requests and background jobs)")
+db_query_seconds = registry.histogram(
+    "db_query_seconds", "Database statement duration",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+slow_queries = registry.counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS by route")
+repeated_queries = registry.counter(
+    "db_repeated_queries_total", "Requests repeating one statement QUERY_REPEAT_LIMIT times (N+1) by route"
+)
+
+_BIND = r"(?:\?|:\w+|%\(\w+\)s)"
+_IN_LIST = re.compile(rf"\bIN \({_BIND}(?:, {_BIND})*\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+_MAX_LOGGED_SQL = 1000
+
+
+@dataclass
+class QueryStats:
+    queries: int = 0
+    rows: int = 0  # rows written: sqlite reports no row count for SELECT before fetching
+    seconds: float = 0.0
+    scope: Optional[dict] = None  # ASGI scope of the request
+    shapes: Counter = field(default_factory=Counter)  # statement shape -> executions
+
+    @property
+    def route(self) -> str:
+        """
+        Route template (/api/favorites/{event_id}), so label values stay bounded.
+        """
+        if self.scope is None:
+            return "background"
+        return getattr(self.scope.get("route"), "path", None) or "unmatched"
+
+
+@lru_cache(maxsize=1024)
+def statement_shape(statement: str) -> str:
+    """
+    Statement with whitespace and IN (...) bind lists collapsed, so the same
+    query with another number of ids has the same shape.
+    """
+    return _IN_LIST.sub("IN (?...)", _SPACES.sub(" ", statement).strip())
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+_captures: List[List[QueryStats]] = []
+_captures_lock = threading.Lock()
+
+
+@contextmanager
+def collect_queries(scope: Optional[dict] = None) -> Iterator[QueryStats]:
+    """
+    Count the statements executed in this context (and the tasks/threads started from it).
+    """
+    stats = QueryStats(scope=scope)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        if _captures:
+            with _captures_lock:
+                for captured in _captures:
+                    captured.append(stats)
+
+
+@contextmanager
+def capture_queries() -> Iterator[List[QueryStats]]:
+    """
+    QueryStats of every request finished while the block runs, in any thread
+    (TestClient serves requests on its own event loop thread).
+    """
+    captured: List[QueryStats] = []
+    with _captures_lock:
+        _captures.append(captured)
+    try:
+        yield captured
+    finally:
+        with _captures_lock:
+            _captures.remove(captured)
+
+
+def _check_queries(stats: QueryStats, limit: Optional[int], repeat_limit: Optional[int]) -> None:
+    repeated = repeat_limit is not None and any(n > repeat_limit for n in stats.shapes.values())
+    if (limit is not None and stats.queries > limit) or repeated:
+        statements = "\n".join(f"  {n} x {shape[:200]}" for shape, n in stats.shapes.most_common())
+        raise AssertionError(
+            f"{stats.route} ran {stats.queries} statements (limit {limit}, repeat limit {repeat_limit}):\n{statements}"
+        )
+
+
+@contextmanager
+def assert_max_queries(limit: int, repeat_limit: Optional[int] = None) -> Iterator[List[QueryStats]]:
+    """
+    Test helper: fail if a request made in the block ran more than limit
+    statements, or one statement more than repeat_limit times.
+
+        with assert_max_queries(4, repeat_limit=1):
+            client.get("/api/events/", headers=auth)
+    """
+    with capture_queries() as captured:
+        yield captured
+    for stats in captured:
+        _check_queries(stats, limit, repeat_limit)
+
+
+@contextmanager
+def assert_query_budgets(budgets: Optional[Dict[str, int]] = None) -> Iterator[List[QueryStats]]:
+    """
+    Test helper: fail if a request made in the block ran more statements than
+    its route's budget ("METHOD /route" -> statements, QUERY_BUDGETS by
+    default) or repeated one statement QUERY_REPEAT_LIMIT times.
+    """
+    budgets = settings.QUERY_BUDGETS if budgets is None else budgets
+    repeat_limit = settings.QUERY_REPEAT_LIMIT - 1 if settings.QUERY_REPEAT_LIMIT else None
+    with capture_queries() as captured:
+        yield captured
+    for stats in captured:
+        method = stats.scope.get("method") if stats.scope else None
+        _check_queries(stats, budgets.get(f"{method} {stats.route}"), repeat_limit)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    db_queries.inc()
+    db_query_seconds.observe(elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.rows += max(cursor.rowcount, 0)
+        stats.seconds += elapsed
+        shape = statement_shape(statement)
+        stats.shapes[shape] += 1
+        if stats.shapes[shape] == settings.QUERY_REPEAT_LIMIT:
+            _report_repeated(stats, shape)
+    if settings.SLOW_QUERY_MS and elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        _report_slow(stats, statement, elapsed)
+
+
+def _report_slow(stats: Optional[QueryStats], statement: str, elapsed: float) -> None:
+    route = stats.route if stats is not None else "background"
+    slow_queries.inc(labels={"route": route})
+    # parameters are not logged: they may hold credentials
+    slow_log.warning(route, f"Slow query ({elapsed * 1000:.0f} ms) in {route}: {_SPACES.sub(' ', statement)[:_MAX_LOGGED_SQL]}")
+
+
+_reported_repeats = set()  # (route, shape) already logged
+
+
+def _report_repeated(stats: QueryStats, shape: str) -> None:
+    route = stats.route
+    repeated_queries.inc(labels={"route": route})
+    # the counter counts every request, the log names each loop once
+    if (route, shape) not in _reported_repeats and len(_reported_repeats) < 1000:
+        _reported_repeats.add((route, shape))
+        logger.warning(
+            f"Possible N+1 in {route}: statement executed {settings.QUERY_REPEAT_LIMIT}+ times "
+            f"in one request: {shape[:_MAX_LOGGED_SQL]}"
+        )
+
+
+def _handle_error(exception_context):
+    # a failed statement never reaches after_cursor_execute
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started:
+        started.pop()
+
+
+def track_queries(engine: Engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
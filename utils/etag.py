@@ -0,0 +1,20 @@
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    return '"' + "-".join(str(p) for p in parts) + '"'
+
+
+def not_modified(request: Request, etag: str, cache_control: str) -> Optional[Response]:
+    """
+    304 response if the client's If-None-Match matches etag, else None.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = [t.strip() for t in header.split(",")]
+    if "*" in tags or etag in tags or f"W/{etag}" in tags:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    return None
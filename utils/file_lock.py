@@ -0,0 +1,68 @@
+import logging
+import os
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class FileLock:
+    """
+    Exclusive advisory lock (flock) between the processes of one host.
+    The OS drops the lock when its holder exits or crashes, so a lock is
+    never left behind.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def locked(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        Take the lock, return False if blocking is False and another process holds it.
+        """
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            logger.warning(f"File locks are not supported here, {self.path} is not locked (run a single worker)")
+            self._fd = -1
+            return True
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        except BaseException:
+            os.close(fd)
+            raise
+        # holder pid, for whoever looks at the file
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        fd, self._fd = self._fd, None
+        if fd is None or fd < 0:
+            return
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
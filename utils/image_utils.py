@@ -1,41 +1,78 @@
 from io import BytesIO
+import hashlib
 import os
+import struct
+from typing import Dict, Sequence
 
-from PIL import Image
+from PIL import Image, ImageOps
 
 
-MAX_DIM = 512  # max width/height
-MAX_BYTES = 2 * 1024 * 1024  # 2 MB
+MAX_PIXELS = 40_000_000  # refuse to decode larger images (decompression bombs)
+QUALITY = 85
+# what decoding a truncated or crafted file can raise
+_DECODE_ERRORS = (
+    OSError, ValueError, EOFError, SyntaxError, struct.error,
+    Image.DecompressionBombError, Image.DecompressionBombWarning,  # the warning if warnings are errors
+)
 
 
-def process_avatar_upload(upload_file, dest_path, preferred_format="WEBP"):
+def avatar_key(data: bytes) -> str:
     """
-    upload_file: UploadFile
-    dest_path: full path including filename where result should be saved
-    preferred_format: 'WEBP' or 'JPEG'
-    Returns saved relative path.
+    Content address of an uploaded avatar (same image -> same file names).
     """
-    img = Image.open(upload_file.file)
-    # convert to RGB if needed
-    if img.mode in ("RGBA", "P"):
-        img = img.convert("RGB")
-    # resize with aspect ratio
-    img.thumbnail((MAX_DIM, MAX_DIM))
-    # save to buffer first with quality/compression loop if needed
-    buf = BytesIO()
-    quality = 85
-    # try iterative reduce if result too big
-    img.save(buf, format=preferred_format, quality=quality, optimize=True)
-    size = buf.tell()
-    while size > MAX_BYTES and quality > 30:
-        quality -= 5
-        buf.seek(0)
-        buf.truncate()
-        img.save(buf, format=preferred_format, quality=quality, optimize=True)
-        size = buf.tell()
-    # finally write to disk
-    buf.seek(0)
-    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-    with open(dest_path, "wb") as f:
-        f.write(buf.read())
-    return dest_path
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def variant_name(key: str, size: int) -> str:
+    return f"{key}_{size}.webp"
+
+
+def save_webp_variants(data: bytes, dest_dir: str, key: str, sizes: Sequence[int], quality: int = QUALITY) -> Dict[str, int]:
+    """
+    Decode an image and save WebP variants of it (one per size, largest
+    side <= size) as <key>_<size>.webp into dest_dir.
+    CPU bound: runs in the image process pool.
+    Returns {path: file size} of the variants. Raises ValueError if data is not a valid image.
+    """
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELS
+    try:
+        img = Image.open(BytesIO(data))
+        # Pillow only raises above twice MAX_IMAGE_PIXELS, below it just warns
+        if img.width * img.height > MAX_PIXELS:
+            raise Image.DecompressionBombError(f"{img.width}x{img.height} image")
+        # decode JPEGs at reduced scale right away
+        img.draft("RGB", (max(sizes), max(sizes)))
+        img = ImageOps.exif_transpose(img)
+        img.load()
+    except _DECODE_ERRORS:
+        raise ValueError("Invalid image") from None
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info or img.mode in ("LA", "PA") else "RGB")
+
+    os.makedirs(dest_dir, exist_ok=True)
+    written = {}
+    for size in sorted(sizes, reverse=True):
+        path = os.path.join(dest_dir, variant_name(key, size))
+        if os.path.exists(path):
+            written[path] = os.path.getsize(path)
+            continue
+        # resize from the previous (larger) variant, each step is cheaper
+        img.thumbnail((size, size), Image.LANCZOS)
+        buf = BytesIO()
+        img.save(buf, format="WEBP", quality=quality, method=4)
+        # write + rename, so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buf.getvalue())
+        os.replace(tmp_path, path)
+        written[path] = buf.tell()
+    return written
+
+
+def make_avatar_variants(data: bytes, dest_dir: str, sizes: Sequence[int], quality: int = QUALITY) -> str:
+    """
+    Save the variants of an uploaded avatar, return its content address.
+    """
+    key = avatar_key(data)
+    save_webp_variants(data, dest_dir, key, sizes, quality)
+    return key
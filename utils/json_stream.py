@@ -0,0 +1,90 @@
+import json
+from typing import IO, Iterator, Tuple, Any
+
+
+READ_SIZE = 64 * 1024  # characters per read
+_WHITESPACE = " \t\n\r"
+_NUMBER_CHARS = "0123456789+-.eE"
+
+
+class _Reader:
+    """
+    Sliding text buffer over a file, drops consumed data.
+    """
+
+    def __init__(self, f: IO[str], read_size: int):
+        self.f = f
+        self.read_size = read_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(self.read_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Next non-whitespace character ("" at end of file).
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError(f"Invalid JSON: expected one of {chars!r}, got {c or 'EOF'!r}")
+        self.pos += 1
+        return c
+
+    def value(self, decoder: json.JSONDecoder) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # value may be cut by the buffer end
+                if self.fill():
+                    continue
+                raise
+            # a number may continue in the next chunk
+            if not self.buf[end:].strip(_NUMBER_CHARS) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_object_items(f: IO[str], read_size: int = READ_SIZE) -> Iterator[Tuple[str, Any]]:
+    """
+    Yield (key, value) pairs of a top-level JSON object one entry at a time,
+    keeping in memory only the current entry and one read buffer.
+    """
+    reader = _Reader(f, read_size)
+    decoder = json.JSONDecoder()
+
+    if reader.peek() != "{":
+        raise ValueError("Expected JSON object mapping event_id -> event_data")
+    reader.pos += 1
+
+    if reader.peek() == "}":
+        return
+    while True:
+        key = reader.value(decoder)
+        if not isinstance(key, str):
+            raise ValueError("Invalid JSON: object key must be a string")
+        reader.expect(":")
+        yield key, reader.value(decoder)
+        if reader.expect(",}") == "}":
+            return
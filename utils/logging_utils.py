@@ -1,50 +1,207 @@
+import atexit
+import json
+import logging
+import queue
 import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
-from typing import Union
+from typing import Dict, List, Optional, Union
 
-import logging
-from logging.handlers import RotatingFileHandler
+from config import settings
+from utils.metrics import registry
 
 
 _logging_configured = False
+_listener: Optional[QueueListener] = None
 _Level = Union[int, str]
 
+dropped_records = registry.counter("log_records_dropped_total", "Log records dropped because the log queue was full")
 
-def setup_logging(logging_level: _Level = logging.DEBUG):
-    global _logging_configured
+# attributes of every LogRecord, anything else was passed in extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
 
-    if _logging_configured:
-        logging.getLogger(__name__).debug("Logging is already set up, skip it")
-        return
-    
-    logs_dir = Path('logs')
-    logs_dir.mkdir(exist_ok=True)
 
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message, exception and
+    the fields passed in extra={...}.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread. When the queue is full, records
+    below ERROR are dropped (and counted) instead of blocking the caller;
+    errors wait for room, so exceptions are not lost.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # render message and traceback here: args and exc_info may not survive
+        # until the listener thread gets to the record
+        record = logging.makeLogRecord(vars(record))
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if record.levelno >= logging.ERROR:
+            self.queue.put(record, timeout=5)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records.inc()
+
+
+class RateLimitedLog:
+    """
+    For high-volume messages: at most burst records per key every interval
+    seconds. The first record after suppressed ones tells how many were dropped.
+
+        unavailable_log = RateLimitedLog(logger, interval=60, burst=5)
+        unavailable_log.warning("unavailable", f"Image {url} is unavailable: {e}")
+    """
+
+    def __init__(self, logger: logging.Logger, interval: float = 60.0, burst: int = 5, max_keys: int = 1000):
+        self.logger = logger
+        self.interval = interval
+        self.burst = burst
+        self.max_keys = max_keys
+        self._windows: Dict[str, List[float]] = {}  # key -> [window start, records, suppressed]
+        self._lock = threading.Lock()
+
+    def _allow(self, key: str) -> Optional[int]:
+        """
+        None if the record is suppressed, else the number suppressed before it.
+        """
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                if window is None and len(self._windows) >= self.max_keys:
+                    self._windows.clear()
+                suppressed = int(window[2]) if window is not None else 0
+                self._windows[key] = [now, 1, 0]
+                return suppressed
+            if window[1] < self.burst:
+                window[1] += 1
+                return 0
+            window[2] += 1
+            return None
+
+    def log(self, level: int, key: str, msg: str, *args, **kwargs) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        suppressed = self._allow(key)
+        if suppressed is None:
+            return
+        if suppressed:
+            msg = f"{msg} ({suppressed} similar messages suppressed)"
+        self.logger.log(level, msg, *args, **kwargs)
+
+    def info(self, key: str, msg: str, *args, **kwargs) -> None:
+        self.log(logging.INFO, key, msg, *args, **kwargs)
+
+    def warning(self, key: str, msg: str, *args, **kwargs) -> None:
+        self.log(logging.WARNING, key, msg, *args, **kwargs)
+
+    def error(self, key: str, msg: str, *args, **kwargs) -> None:
+        self.log(logging.ERROR, key, msg, *args, **kwargs)
+
+
+def _formatter() -> logging.Formatter:
+    if settings.LOG_FORMAT == "json":
+        return JsonFormatter()
+    return logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+def _output_handlers() -> List[logging.Handler]:
+    logs_dir = Path(settings.LOG_DIR)
+    logs_dir.mkdir(exist_ok=True)
+    formatter = _formatter()
 
-    # root (console + file) logging
     console_handler = logging.StreamHandler(sys.stdout) # for root logging to console
     console_handler.setFormatter(formatter)
 
     root_file_handler = RotatingFileHandler( # for root loggin to file
         logs_dir / 'app.log',
-        maxBytes=10*1024*1024,  # 10MB
-        backupCount=10,
+        maxBytes=settings.LOG_FILE_BYTES,
+        backupCount=settings.LOG_FILE_COUNT,
         encoding='utf-8'
     )
     root_file_handler.setFormatter(formatter)
-    
+    return [console_handler, root_file_handler]
+
+
+def setup_logging(logging_level: Optional[_Level] = None):
+    """
+    Root logging through a queue: log calls only enqueue the record, a
+    listener thread formats it and writes it to the console and the
+    rotating file, so disk I/O and file rotation never block a request.
+    """
+    global _logging_configured, _listener
+
+    if _logging_configured:
+        logging.getLogger(__name__).debug("Logging is already set up, skip it")
+        return
+
+    handlers = _output_handlers()
+    log_queue: queue.Queue = queue.Queue(settings.LOG_QUEUE_SIZE)
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
     root_logger = logging.getLogger()
-    root_logger.setLevel(logging_level)
-    root_logger.addHandler(console_handler)
-    root_logger.addHandler(root_file_handler)
-    
-    # logging for library (a little less noise)
-    logging.getLogger('playwright').setLevel(logging.WARNING)
-    logging.getLogger('sqlalchemy').setLevel(logging.WARNING)
-    logging.getLogger('asyncio').setLevel(logging.WARNING)
-
-    # logging.debug('Logging was succesfully configured')
+    root_logger.setLevel(logging_level if logging_level is not None else settings.LOG_LEVEL)
+    root_logger.addHandler(_NonBlockingQueueHandler(log_queue))
+
+    # per-module levels (a little less noise from libraries)
+    for name, level in settings.LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level)
+
+    # records logged at interpreter exit are written too
+    atexit.register(stop_logging)
     _logging_configured = True
+
+
+def stop_logging():
+    """
+    Write out the queued records and stop the listener thread. Records
+    logged later go to the output handlers directly.
+    """
+    global _listener
+
+    listener, _listener = _listener, None
+    if listener is None:
+        return
+    listener.stop()
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        if isinstance(handler, _NonBlockingQueueHandler):
+            root_logger.removeHandler(handler)
+    for handler in listener.handlers:
+        root_logger.addHandler(handler)
+        handler.flush()
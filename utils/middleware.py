@@ -0,0 +1,214 @@
+import logging
+import math
+import time
+from typing import Optional
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.routing import BaseRoute, Match
+
+from config import settings
+from utils.admission import RouteGates, TokenBucketLimiter, client_address, parse_networks
+from utils.db_stats import collect_queries
+from utils.logging_utils import RateLimitedLog
+from utils.metrics import registry
+from utils.security import cached_identity
+
+
+logger = logging.getLogger(__name__)
+budget_log = RateLimitedLog(logger, interval=60, burst=1)
+shed_log = RateLimitedLog(logger, interval=60, burst=1)
+
+_QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+request_seconds = registry.histogram("http_request_duration_seconds", "Request latency by route")
+responses = registry.counter("http_responses_total", "Responses by route and status code")
+request_queries = registry.histogram("http_request_db_queries", "Database statements per request", buckets=_QUERY_BUCKETS)
+request_db_seconds = registry.histogram("http_request_db_seconds", "Database time per request")
+request_rows = registry.counter("http_request_db_rows_total", "Rows written by the statements of requests")
+over_budget = registry.counter("http_query_budget_exceeded_total", "Requests over their route's QUERY_BUDGETS entry")
+rejected = registry.counter("http_rejected_total", "Requests rejected by rate limits (429) and admission control (503) by reason")
+
+route_gates = RouteGates(
+    settings.ADMISSION_CONCURRENCY, settings.ADMISSION_LIMITS, settings.ADMISSION_QUEUE_LIMIT, settings.ADMISSION_QUEUE_TIMEOUT
+)
+client_limiter = TokenBucketLimiter(settings.RATE_LIMIT, settings.RATE_LIMIT_BURST, settings.RATE_LIMIT_CLIENTS)
+route_limiters = {
+    key: TokenBucketLimiter(rate, int(burst), settings.RATE_LIMIT_CLIENTS) for key, (rate, burst) in settings.RATE_LIMITS.items()
+}
+trusted_proxies = parse_networks(settings.TRUSTED_PROXIES)
+# "METHOD /route" -> request body bytes at most: the avatar plus the other form fields and the multipart framing
+body_limits = {"POST /api/auth/register": settings.AVATAR_MAX_BYTES + 64 * 1024}
+registry.gauge("http_admission_waiting", "Requests waiting for a concurrency slot of their route", route_gates.waiting)
+
+
+class MetricsMiddleware:
+    """
+    Latency histogram, status counts and database usage per route, and a
+    warning for requests running more statements than their query budget.
+    Plain ASGI middleware: no per-request task or body buffering.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500  # unless a response was started
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        with collect_queries(scope) as queries:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = queries.route
+                labels = {"method": scope["method"], "route": route}
+                request_seconds.observe(time.perf_counter() - started, labels)
+                responses.inc(labels={**labels, "status": str(status_code)})
+                request_queries.observe(queries.queries, labels)
+                request_db_seconds.observe(queries.seconds, labels)
+                if queries.rows:
+                    request_rows.inc(queries.rows, labels)
+
+                budget = settings.QUERY_BUDGETS.get(f"{scope['method']} {route}")
+                if budget is not None and queries.queries > budget:
+                    over_budget.inc(labels=labels)
+                    budget_log.warning(
+                        f"{scope['method']} {route}", f"{scope['method']} {route} ran {queries.queries} statements, budget is {budget}"
+                    )
+
+
+def _match_route(scope) -> Optional[BaseRoute]:
+    # what the router will pick; middleware runs before it
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route
+    return None
+
+
+def _client_key(scope) -> str:
+    """
+    Rate limit key: the user of a bearer token found in the TokenCache,
+    else the client address (TRUSTED_PROXIES). Tokens are not verified
+    here, that is the work admission control saves; an unknown token
+    counts against its address, so made-up tokens get no buckets of their own.
+    """
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                identity = cached_identity(token)
+                if identity is not None:
+                    return f"user:{identity.id}"
+            break
+    return f"ip:{client_address(scope, trusted_proxies)}"
+
+
+class AdmissionMiddleware:
+    """
+    Per-client token bucket rate limits (429) and per-route concurrency
+    limits with a bounded wait queue (503), checked before the request
+    reaches the threadpool or the database. Both answers carry Retry-After.
+    Routes are keyed like QUERY_BUDGETS ("METHOD /route"); buckets and
+    queues are per worker process.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = _match_route(scope)
+        path = getattr(route, "path", None) or "unmatched"
+        key = f"{scope['method']} {path}"
+        if key in settings.ADMISSION_EXEMPT:
+            await self.app(scope, receive, send)
+            return
+        if route is not None:
+            scope["route"] = route  # route label of the metrics, also for rejected requests
+        labels = {"method": scope["method"], "route": path}
+
+        if settings.RATE_LIMIT_ENABLED:
+            limiter = route_limiters.get(key, client_limiter)
+            wait = limiter.acquire(_client_key(scope))
+            if wait:
+                rejected.inc(labels={**labels, "reason": "rate_limit"})
+                await self._reject(scope, receive, send, 429, "Too many requests, slow down", wait)
+                return
+
+        if route is None or settings.ADMISSION_CONCURRENCY <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        gate = route_gates.get(key)
+        reason = await gate.acquire()
+        if reason is not None:
+            rejected.inc(labels={**labels, "reason": reason})
+            shed_log.warning(key, f"Shedding {key} ({reason}): {gate.active} in progress, {gate.waiting} waiting")
+            await self._reject(scope, receive, send, 503, "Server is busy, try again later", settings.ADMISSION_RETRY_AFTER)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
+
+    @staticmethod
+    async def _reject(scope, receive, send, status_code: int, detail: str, retry_after: float) -> None:
+        headers = {"Retry-After": str(max(1, math.ceil(retry_after)))}
+        await JSONResponse({"detail": detail}, status_code=status_code, headers=headers)(scope, receive, send)
+
+
+class BodyLimitMiddleware:
+    """
+    Request body caps of body_limits routes: 413 for a larger Content-Length
+    before anything is read, and 413 as soon as a body streams past the cap
+    (chunked or understated), instead of after the multipart parser has
+    spooled all of it to disk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.methods = {key.split(" ", 1)[0] for key in body_limits}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in self.methods:
+            await self.app(scope, receive, send)
+            return
+        route = scope.get("route") or _match_route(scope)
+        limit = body_limits.get(f"{scope['method']} {getattr(route, 'path', None)}")
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body must be at most {limit} bytes"
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+                return
+
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # raised into the body parser, the app answers it like any HTTPException
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, receive_limited, send)
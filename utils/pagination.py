@@ -0,0 +1,35 @@
+import base64
+import json
+from typing import Any, Optional
+
+from fastapi import HTTPException
+
+
+# Opaque keyset cursors: base64url encoded JSON of the last seen sort key.
+
+# int keys are bound as 64-bit SQL integers
+INT_MIN, INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+def encode_cursor(key: Any) -> str:
+    raw = json.dumps({"k": key}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: Optional[str], key_type: type, minimum: int = INT_MIN) -> Optional[Any]:
+    """
+    Return the sort key stored in the cursor (None if no cursor given).
+    int keys must lie between minimum and INT_MAX.
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)["k"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(key, key_type) or isinstance(key, bool):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if key_type is int and not minimum <= key <= INT_MAX:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key
@@ -0,0 +1,157 @@
+"""
+EXPLAIN QUERY PLAN checks for the hot list queries (SQLite).
+
+    python -m utils.query_plan
+
+exits with status 1 if a query scans a whole table, sorts a page in a
+temporary b-tree or is not driven by its index. The plans depend on the
+planner statistics, so check a populated database (tests/test_query_plans.py
+builds one).
+"""
+import re
+import sys
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from models import Base, Event, Favorite, Ticket
+
+
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)")
+_ACCESS = re.compile(r"^(?:SCAN|SEARCH) (?:TABLE )?(\w+)(?: USING (?:COVERING |PRIMARY KEY |INTEGER PRIMARY KEY )?(?:INDEX (\w+))?)?")
+_RUBRIC_LOOKUP = re.compile(r"^SEARCH rubrics USING (?:COVERING )?INDEX \w+ \(code=\?\)")
+
+# query (without the [rubric=...] suffix) -> indexes its plan may start from;
+# the lookup of the rubric by its code is a single row and does not count
+DRIVING_INDEXES: Dict[str, set] = {
+    "catalog.events": {"ix_events_archived_id"},
+    "events.count": {"ix_events_archived_id", "ix_event_rubrics_rubric_event"},
+    "events.page": {"ix_events_archived_id"},
+    "events.by_ids": {"ix_events_archived_id"},
+    "favorites.count": {"ix_favorites_user_id", "sqlite_autoindex_favorites_1"},  # unique (user_id, event_id)
+    "favorites.page": {"ix_favorites_user_id"},
+    "tickets.count": {"ix_tickets_user_id", "sqlite_autoindex_tickets_1"},
+    "tickets.page": {"ix_tickets_user_id"},
+}
+
+
+def update_statistics(conn: Connection) -> None:
+    """
+    Refresh the planner statistics (sqlite_stat1). Taken on an empty
+    database they make the planner walk every active event for a user's
+    favorites, so run after imports and migrations.
+    """
+    if conn.dialect.name == "sqlite":
+        # sampled: bounded time on large tables, like PRAGMA optimize
+        conn.exec_driver_sql("PRAGMA analysis_limit=1000")
+        conn.exec_driver_sql("ANALYZE")
+    elif conn.dialect.name == "postgresql":
+        conn.exec_driver_sql("ANALYZE")
+
+
+def query_plan(db: Session, stmt) -> List[str]:
+    """
+    Detail lines of the SQLite query plan of a statement.
+    """
+    bind = db.get_bind()
+    if bind.dialect.name != "sqlite":
+        raise RuntimeError("EXPLAIN QUERY PLAN checks need SQLite")
+    sql = str(stmt.compile(dialect=bind.dialect, compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def full_scans(plan: List[str]) -> List[str]:
+    """
+    Plan lines reading a whole table instead of searching an index.
+    """
+    tables = set(Base.metadata.tables)
+    return [
+        line for line in plan
+        if (m := _SCAN.match(line)) and m.group(1) in tables and "INDEX" not in line
+    ]
+
+
+def driving_index(plan: List[str]) -> Optional[str]:
+    """
+    Index of the first table access of the plan ("table" if it reads the table itself).
+    """
+    for line in plan:
+        if _RUBRIC_LOOKUP.match(line):
+            continue
+        m = _ACCESS.match(line)
+        if m:
+            return m.group(2) or m.group(1)
+    return None
+
+
+def plan_problems(name: str, plan: List[str]) -> List[str]:
+    """
+    What is wrong with the plan of the hot query `name`, empty if nothing.
+    """
+    problems = [f"full scan: {line}" for line in full_scans(plan)]
+    if ".page" in name:
+        problems += [f"sorts the page: {line}" for line in plan if "TEMP B-TREE" in line]
+    expected = DRIVING_INDEXES.get(name.split("[")[0])
+    driver = driving_index(plan)
+    if expected and driver not in expected:
+        problems.append(f"driven by {driver}, expected {' or '.join(sorted(expected))}")
+    return problems
+
+
+def hot_queries() -> Dict[str, object]:
+    """
+    Statements run by the events, favorites and tickets list endpoints.
+    """
+    from routers.events import events_query
+    from routers.favorites import favorites_query
+    from routers.tickets import tickets_query
+
+    def count(query):
+        return select(func.count()).select_from(query.subquery())
+
+    queries = {
+        "catalog.events": select(Event.id, Event.title).where(Event.archived == False).order_by(Event.id),
+    }
+    for rubric in (None, "concert"):
+        suffix = f"[rubric={rubric}]" if rubric else ""
+        events = events_query(rubric)
+        queries[f"events.count{suffix}"] = count(events)
+        queries[f"events.page{suffix}"] = events.order_by(Event.id).where(Event.id > "0").limit(13)
+        favorites = favorites_query(1, rubric)
+        queries[f"favorites.count{suffix}"] = count(favorites)
+        queries[f"favorites.page{suffix}"] = favorites.order_by(Favorite.id.desc()).limit(13)
+        tickets = tickets_query(1, rubric)
+        queries[f"tickets.count{suffix}"] = count(tickets)
+        queries[f"tickets.page{suffix}"] = tickets.order_by(Ticket.id).limit(13)
+    queries["events.by_ids"] = events_query(ids=["0" * 24, "f" * 24]).order_by(Event.id).limit(13)
+    return queries
+
+
+def check_query_plans(db: Session) -> Dict[str, List[str]]:
+    """
+    Problems per hot query, only queries with problems are returned.
+    """
+    problems = {}
+    for name, stmt in hot_queries().items():
+        found = plan_problems(name, query_plan(db, stmt))
+        if found:
+            problems[name] = found
+    return problems
+
+
+def main() -> int:
+    from database import SessionLocal, init_db
+
+    init_db()
+    with SessionLocal() as db:
+        problems = check_query_plans(db)
+    for name, found in problems.items():
+        print(f"{name}: {'; '.join(found)}")
+    print(f"{len(problems)} of {len(hot_queries())} queries have plan problems")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,32 +1,44 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Callable, Dict, Optional, Set, Tuple, TypeVar
 
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
 from passlib.context import CryptContext
 
-from database import SessionLocal
+from database import AsyncSessionLocal
 from models import User
 from config import settings
+from utils.metrics import registry
 
 
 # OAuth2 scheme for token
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing (hashes with another cost than BCRYPT_ROUNDS need update)
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 # Bearer authorization
 security = HTTPBearer(auto_error=False)
 
 
 # Database dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
 # JWT token creation
@@ -41,52 +53,156 @@ def create_access_token(data: dict, expires_minutes: Optional[int] = None) -> st
     return jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
 
 
-# Get current user (required)
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+# Lightweight identity of an authenticated user
+@dataclass(frozen=True)
+class UserIdentity:
+    id: int
+
+
+class TokenCache:
     """
-    Get user from JWT token (Authorization: Bearer <token>)
+    Bounded TTL cache: sha256(token) -> verified identity.
+    Entries never outlive the token itself; safe to use from the threadpool.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[UserIdentity, float]]" = OrderedDict()
+        self._by_user: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[UserIdentity]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, identity: UserIdentity, token_exp: Optional[float]) -> None:
+        expires = time.monotonic() + self.ttl
+        if token_exp is not None:
+            expires = min(expires, time.monotonic() + (token_exp - time.time()))
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (identity, expires)
+            self._by_user.setdefault(identity.id, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for key in list(self._by_user.get(user_id, ())):
+                self._drop(key)
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._by_user.get(entry[0].id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_user[entry[0].id]
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_TTL_SECONDS)
+
+
+# drop cached identities when a user record changes
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user_tokens(mapper, connection, target):
+    token_cache.invalidate_user(target.id)
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def cached_identity(token: str) -> Optional[UserIdentity]:
+    """
+    Identity of a token verified recently (TokenCache), None otherwise. No JWT decoding, no database.
     """
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+    return token_cache.get(_token_key(token))
+
+
+async def resolve_identity(token: str) -> Optional[UserIdentity]:
+    """
+    Verify JWT and return the user identity, or None.
+    The users table is only checked on a cache miss.
+    """
+    key = _token_key(token)
+    identity = token_cache.get(key)
+    if identity is not None:
+        return identity
+
     try:
         payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        user_id: int = int(payload.get("sub"))
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+        user_id = int(payload.get("sub"))
+    except (JWTError, TypeError, ValueError):
+        return None
+
+    async with AsyncSessionLocal() as db:
+        if await db.get(User, user_id) is None:
+            return None
+    identity = UserIdentity(id=user_id)
+    token_cache.put(key, identity, payload.get("exp"))
+    return identity
+
+
+# Get current user identity (required), no DB access for cached tokens
+async def get_current_identity(token: str = Depends(oauth2_scheme)) -> UserIdentity:
+    identity = await resolve_identity(token)
+    if identity is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return identity
+
+
+# Get optional user identity (not required)
+async def get_optional_identity(
+    creds: Optional[HTTPAuthorizationCredentials] = Depends(security),
+) -> Optional[UserIdentity]:
+    if not creds:
+        return None
+    return await resolve_identity(creds.credentials)
 
-    user = db.query(User).get(user_id)
-    if user is None:
-        raise credentials_exception
 
+# Get current user (required)
+async def get_current_user(identity: UserIdentity = Depends(get_current_identity), db: AsyncSession = Depends(get_db)) -> User:
+    """
+    Get user from JWT token (Authorization: Bearer <token>)
+    """
+    user = await db.get(User, identity.id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 
 # Get optional user (not required)
-def get_optional_user(
-    creds: Optional[HTTPAuthorizationCredentials] = Depends(security),
-    db: Session = Depends(get_db),
+async def get_optional_user(
+    identity: Optional[UserIdentity] = Depends(get_optional_identity),
+    db: AsyncSession = Depends(get_db),
 ) -> Optional[User]:
     """
     Get user from JWT token, or None.
     """
-    if not creds:
+    if identity is None:
         return None
-    token = creds.credentials
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        user_id = payload.get("sub")
-        if not user_id:
-            return None
-        return db.query(User).get(int(user_id))
-    except JWTError:
-        return None
-    
-    
+    return await db.get(User, identity.id)
+
+
 # Password utils
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -94,3 +210,79 @@ def hash_password(password: str) -> str:
 
 def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
+
+
+def verify_and_update_password(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify password, return (ok, new hash if the stored one uses another cost).
+    """
+    return pwd_context.verify_and_update(plain, hashed)
+
+
+_T = TypeVar("_T")
+
+
+class PasswordHashingPool:
+    """
+    Dedicated bounded executor for CPU-bound bcrypt work, so hashing bursts
+    do not occupy the shared threadpool. Jobs beyond workers + queue_limit
+    are rejected with 503.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.capacity = workers + queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._pending = 0
+        self._running = 0
+        self._lock = threading.Lock()
+
+        self.rejected = registry.counter("password_hash_rejected_total", "Password hash jobs rejected, pool saturated")
+        self.wait_time = registry.histogram(
+            "password_hash_wait_seconds", "Time password hash jobs wait for a worker",
+            buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+        )
+        registry.gauge("password_hash_queue_depth", "Password hash jobs waiting for a worker", self.queue_depth)
+        registry.gauge("password_hash_in_flight", "Password hash jobs running", lambda: self._running)
+
+    def queue_depth(self) -> int:
+        return self._pending - self._running
+
+    async def run(self, fn: Callable[..., _T], *args) -> _T:
+        with self._lock:
+            if self._pending >= self.capacity:
+                self.rejected.inc()
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy, try again later",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+        submitted = time.perf_counter()
+
+        def job():
+            self.wait_time.observe(time.perf_counter() - submitted)
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        def release(_future):
+            # also for jobs cancelled before they started (the request went away)
+            with self._lock:
+                self._pending -= 1
+
+        try:
+            future = self._executor.submit(job)
+        except RuntimeError:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+
+hashing_pool = PasswordHashingPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_LIMIT)